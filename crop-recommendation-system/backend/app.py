@@ -3,16 +3,38 @@ Crop Recommendation System - Flask Backend API
 This API serves predictions from the trained ML/DL models
 """
 
-from flask import Flask, request, jsonify
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import pickle
-import numpy as np
 import os
 from datetime import datetime
 
+import explain
+import irrigation
+import profiling
+import recommender
+import sweep
+from batching import InferenceTimeout
+from json_provider import FastJSONProvider, NDJSON_MIMETYPE, dumps_ndjson_line, wants_ndjson
+
+recommender.record_startup_phase('import', time.perf_counter() - _import_started)
+
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
+# Headers whose values are never written to the request log
+REDACTED_HEADERS = {'x-admin-token', 'authorization', 'cookie'}
+
+def loggable_headers():
+    """Request headers for the log, with credentials masked"""
+    return {
+        name: '<redacted>' if name.lower() in REDACTED_HEADERS else value
+        for name, value in request.headers.items()
+    }
+
 # Simple request logging to help diagnose 404/route issues
 @app.before_request
 def log_request():
@@ -21,107 +43,38 @@ def log_request():
     except Exception:
         body = '<unavailable>'
     try:
-        headers = dict(request.headers)
+        headers = loggable_headers()
     except Exception:
         headers = {}
     qs = request.query_string.decode() if request.query_string else ''
     remote = request.remote_addr
     print(f"[REQUEST] {request.method} {request.path} Remote: {remote} Query: {qs} Headers: {headers} Body: {body}")
 
-# Model paths
-MODEL_PATH = 'crop_recommendation_model.pkl'
-SCALER_PATH = 'feature_scaler.pkl'
-ENCODER_PATH = 'label_encoder.pkl'
-
-# Load models and preprocessors
-try:
-    with open(MODEL_PATH, 'rb') as f:
-        model = pickle.load(f)
-    with open(SCALER_PATH, 'rb') as f:
-        scaler = pickle.load(f)
-    with open(ENCODER_PATH, 'rb') as f:
-        label_encoder = pickle.load(f)
-    print("[OK] Models loaded successfully")
-except FileNotFoundError as e:
-    print(f"[WARNING] Model file not found: {e}")
-    model = scaler = label_encoder = None
-
-# Crop information database
-CROP_INFO = {
-    'Rice': {
-        'optimal_temperature': '21-27°C',
-        'optimal_humidity': '80-100%',
-        'optimal_rainfall': '200-300mm',
-        'ph_range': '6.0-7.5',
-        'season': 'Monsoon',
-        'soil_type': 'Clayey soil, well-drained'
-    },
-    'Wheat': {
-        'optimal_temperature': '15-25°C',
-        'optimal_humidity': '40-80%',
-        'optimal_rainfall': '40-100mm',
-        'ph_range': '6.0-7.5',
-        'season': 'Winter',
-        'soil_type': 'Well-drained loamy soil'
-    },
-    'Corn': {
-        'optimal_temperature': '21-27°C',
-        'optimal_humidity': '60-80%',
-        'optimal_rainfall': '50-200mm',
-        'ph_range': '6.0-8.0',
-        'season': 'Kharif',
-        'soil_type': 'Well-drained fertile soil'
-    },
-    'Cotton': {
-        'optimal_temperature': '21-30°C',
-        'optimal_humidity': '40-60%',
-        'optimal_rainfall': '50-150mm',
-        'ph_range': '6.0-7.5',
-        'season': 'Kharif',
-        'soil_type': 'Well-drained loamy to clayey soil'
-    },
-    'Sugarcane': {
-        'optimal_temperature': '21-27°C',
-        'optimal_humidity': '70-90%',
-        'optimal_rainfall': '100-250mm',
-        'ph_range': '6.0-8.0',
-        'season': 'Year-round',
-        'soil_type': 'Deep, well-drained, fertile loamy soil'
-    },
-    'Pulses': {
-        'optimal_temperature': '20-30°C',
-        'optimal_humidity': '50-70%',
-        'optimal_rainfall': '40-100mm',
-        'ph_range': '6.5-8.0',
-        'season': 'Rabi',
-        'soil_type': 'Well-drained loamy soil'
-    },
-    'Barley': {
-        'optimal_temperature': '10-25°C',
-        'optimal_humidity': '40-70%',
-        'optimal_rainfall': '30-100mm',
-        'ph_range': '6.5-8.0',
-        'season': 'Rabi',
-        'soil_type': 'Well-drained fertile soil'
-    },
-    'Maize': {
-        'optimal_temperature': '21-27°C',
-        'optimal_humidity': '60-80%',
-        'optimal_rainfall': '60-200mm',
-        'ph_range': '6.0-8.0',
-        'season': 'Kharif',
-        'soil_type': 'Well-drained fertile loamy soil'
-    }
-}
+@app.before_request
+def ensure_models_loaded():
+    """Load the models on the first request if the host skipped recommender.startup()"""
+    if not recommender.model_ready:
+        recommender.ensure_started()
 
 @app.route('/api/health', methods=['GET'])
 def health():
-    """Health check endpoint"""
+    """Health check endpoint (returns 503 until warmup inference has run)"""
     return jsonify({
-        'success': True,
-        'message': 'Crop Recommendation API is running',
+        'success': recommender.model_ready,
+        'message': 'Crop Recommendation API is running' if recommender.model_ready
+                   else 'Crop Recommendation API is warming up',
         'timestamp': datetime.now().isoformat(),
-        'model_status': 'loaded' if model else 'not_loaded'
+        'model_status': 'loaded' if recommender.model else 'not_loaded',
+        'ready': recommender.model_ready,
+        'pid': os.getpid()
+    }), 200 if recommender.model_ready else 503
+
+@app.route('/api/startup', methods=['GET'])
+def startup_profile():
+    """Startup profile: time spent importing, loading the models and warming up"""
+    return jsonify({
+        'success': True,
+        'data': recommender.get_startup_profile()
     }), 200
 
 @app.route('/api/recommend', methods=['GET', 'POST'])
@@ -141,7 +94,7 @@ def recommend():
     }
     """
     try:
-        if model is None or scaler is None or label_encoder is None:
+        if not recommender.models_loaded():
             return jsonify({
                 'success': False,
                 'error': 'Models not loaded'
@@ -160,100 +113,183 @@ def recommend():
         else:
             data = request.get_json()
         
-        # Validate required fields
-        required_fields = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
-        if not all(field in data for field in required_fields):
+        values, error = recommender.validate_recommend_input(data)
+        if error:
             return jsonify({
                 'success': False,
-                'error': 'Missing required fields: ' + ', '.join(required_fields)
+                'error': error
             }), 400
 
-        # Extract and validate values
-        try:
-            N = float(data['N'])
-            P = float(data['P'])
-            K = float(data['K'])
-            temperature = float(data['temperature'])
-            humidity = float(data['humidity'])
-            ph = float(data['ph'])
-            rainfall = float(data['rainfall'])
-        except ValueError:
+        response = {
+            'success': True,
+            'data': recommender.recommend_crop(values)
+        }
+
+        return jsonify(response), 200
+
+    except InferenceTimeout as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }), 500
+
+@app.route('/api/recommend/batch', methods=['POST'])
+def recommend_batch():
+    """
+    Get crop recommendations for many inputs in one call
+
+    Request body:
+    {
+        "inputs": [{"N": ..., "P": ..., ...}, ...]
+    }
+    Each row is validated independently; invalid rows are reported with the
+    same error messages as /api/recommend and do not fail the whole batch.
+
+    With "Accept: application/x-ndjson" (or ?stream=ndjson) the results are
+    streamed back one JSON object per line, scored chunk by chunk so memory
+    stays bounded for large batches.
+    """
+    try:
+        if not recommender.models_loaded():
+            return jsonify({
+                'success': False,
+                'error': 'Models not loaded'
+            }), 500
+
+        data = request.get_json(silent=True)
+        records = data.get('inputs') if isinstance(data, dict) else data
+        if not isinstance(records, list) or not records:
+            return jsonify({
+                'success': False,
+                'error': 'Request body must contain a non-empty "inputs" list'
+            }), 400
+        stream = wants_ndjson(request.headers.get('Accept'), request.args.get('stream'))
+        max_rows = recommender.MAX_STREAM_ROWS if stream else recommender.MAX_BATCH_ROWS
+        if len(records) > max_rows:
             return jsonify({
                 'success': False,
-                'error': 'Invalid data types. All parameters must be numbers.'
+                'error': f'Too many inputs: at most {max_rows} per request'
             }), 400
 
-        # Validate ranges
-        validation_errors = []
-        if not (0 <= N <= 140):
-            validation_errors.append("Nitrogen must be between 0-140 ppm")
-        if not (5 <= P <= 145):
-            validation_errors.append("Phosphorus must be between 5-145 ppm")
-        if not (5 <= K <= 205):
-            validation_errors.append("Potassium must be between 5-205 ppm")
-        if not (8 <= temperature <= 43):
-            validation_errors.append("Temperature must be between 8-43°C")
-        if not (14 <= humidity <= 100):
-            validation_errors.append("Humidity must be between 14-100%")
-        if not (3.5 <= ph <= 9.5):
-            validation_errors.append("pH must be between 3.5-9.5")
-        if not (20 <= rainfall <= 300):
-            validation_errors.append("Rainfall must be between 20-300mm")
-
-        if validation_errors:
+        if stream:
+            return Response(stream_ndjson(records), mimetype=NDJSON_MIMETYPE), 200
+
+        results = recommender.recommend_batch(records)
+        return jsonify({
+            'success': True,
+            'data': {
+                'count': len(results),
+                'valid': sum(1 for r in results if r['success']),
+                'results': results
+            }
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }), 500
+
+@app.route('/api/recommend/explain', methods=['GET', 'POST'])
+def recommend_explain():
+    """
+    Explain a crop recommendation: how much each input feature pushed the
+    probability of the top crops up or down (same input as /api/recommend)
+    """
+    try:
+        if not recommender.models_loaded():
+            return jsonify({
+                'success': False,
+                'error': 'Models not loaded'
+            }), 500
+
+        data = request.args.to_dict() if request.method == 'GET' else request.get_json(silent=True)
+        values, error = recommender.validate_recommend_input(data)
+        if error:
             return jsonify({
                 'success': False,
-                'error': 'Validation errors: ' + '; '.join(validation_errors)
+                'error': error
             }), 400
 
-        # Prepare input for model
-        input_data = np.array([[N, P, K, temperature, humidity, ph, rainfall]])
-        
-        # Scale the input
-        scaled_input = scaler.transform(input_data)
-        
-        # Make prediction
-        prediction_encoded = model.predict(scaled_input)[0]
-        probabilities = model.predict_proba(scaled_input)[0]
-        
-        # Decode prediction
-        recommended_crop = label_encoder.inverse_transform([prediction_encoded])[0]
-        confidence = float(probabilities[prediction_encoded])
-        
-        # Get top 3 recommendations
-        top_indices = np.argsort(probabilities)[-3:][::-1]
-        top_recommendations = [
-            [label_encoder.inverse_transform([idx])[0], float(probabilities[idx])]
-            for idx in top_indices
-        ]
-
-        # Build response
-        response = {
+        return jsonify({
+            'success': True,
+            'data': explain.explain_one(values)
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }), 500
+
+@app.route('/api/recommend/explain/batch', methods=['POST'])
+def recommend_explain_batch():
+    """Explain recommendations for many inputs in one vectorized pass"""
+    try:
+        if not recommender.models_loaded():
+            return jsonify({
+                'success': False,
+                'error': 'Models not loaded'
+            }), 500
+
+        data = request.get_json(silent=True)
+        records = data.get('inputs') if isinstance(data, dict) else data
+        if not isinstance(records, list) or not records:
+            return jsonify({
+                'success': False,
+                'error': 'Request body must contain a non-empty "inputs" list'
+            }), 400
+        if len(records) > recommender.MAX_BATCH_ROWS:
+            return jsonify({
+                'success': False,
+                'error': f'Too many inputs: at most {recommender.MAX_BATCH_ROWS} per request'
+            }), 400
+
+        results = explain.explain_batch(records)
+        return jsonify({
             'success': True,
             'data': {
-                'input': {
-                    'N': N,
-                    'P': P,
-                    'K': K,
-                    'temperature': temperature,
-                    'humidity': humidity,
-                    'ph': ph,
-                    'rainfall': rainfall
-                },
-                'recommendation': recommended_crop,
-                'confidence': confidence,
-                'top_recommendations': top_recommendations,
-                'crop_info': {
-                    recommended_crop: CROP_INFO.get(
-                        recommended_crop,
-                        {'error': 'Crop information not available'}
-                    )
-                },
-                'timestamp': datetime.now().isoformat()
+                'count': len(results),
+                'valid': sum(1 for r in results if r['success']),
+                'results': results
             }
-        }
+        }), 200
 
-        return jsonify(response), 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }), 500
+
+@app.route('/api/recommend/sweep', methods=['POST'])
+def recommend_sweep():
+    """
+    What-if sweep: vary one or two features over a range around a base input
+    and return per-crop probability curves (see sweep.py for the body)
+    """
+    try:
+        if not recommender.models_loaded():
+            return jsonify({
+                'success': False,
+                'error': 'Models not loaded'
+            }), 500
+
+        spec, error = sweep.parse_sweep_request(request.get_json(silent=True))
+        if error:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
+
+        return jsonify({
+            'success': True,
+            'data': sweep.run_sweep(spec)
+        }), 200
 
     except Exception as e:
         return jsonify({
@@ -261,6 +297,14 @@ def recommend():
             'error': f'Server error: {str(e)}'
         }), 500
 
+def stream_ndjson(records):
+    """Yield batch results as NDJSON lines, ending with an error line if scoring fails"""
+    try:
+        for result in recommender.iter_recommend_batch(records, recommender.STREAM_CHUNK_ROWS):
+            yield dumps_ndjson_line(result)
+    except Exception as e:
+        yield dumps_ndjson_line({'success': False, 'error': f'Server error: {str(e)}'})
+
 # Alias route to tolerate common client typos (forwards to same view)
 @app.route('/api/recommendation', methods=['POST'])
 def recommend_alias():
@@ -273,10 +317,7 @@ def get_crops():
     try:
         return jsonify({
             'success': True,
-            'data': {
-                'crops': list(CROP_INFO.keys()),
-                'crop_info': CROP_INFO
-            }
+            'data': recommender.get_crops()
         }), 200
     except Exception as e:
         return jsonify({
@@ -287,14 +328,26 @@ def get_crops():
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     """Get API statistics"""
+    try:
+        return jsonify({
+            'success': True,
+            'data': recommender.get_stats()
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }), 500
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Get inference and sensor-ingest batching metrics (batch sizes and queueing latency)"""
     try:
         return jsonify({
             'success': True,
             'data': {
-                'total_crops': len(CROP_INFO),
-                'crops': list(CROP_INFO.keys()),
-                'model_type': 'Random Forest Classifier',
-                'features': ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+                'batching': recommender.get_batching_metrics(),
+                'irrigation': irrigation.get_ingest_metrics()
             }
         }), 200
     except Exception as e:
@@ -303,6 +356,39 @@ def get_stats():
             'error': f'Server error: {str(e)}'
         }), 500
 
+# Endpoints whose requests can be captured with cProfile while profiling is on
+PROFILED_ENDPOINTS = ['recommend', 'recommend_batch', 'recommend_explain', 'recommend_sweep']
+
+@app.route('/api/admin/profiling', methods=['GET', 'POST'])
+def admin_profiling():
+    """
+    Turn on-demand profiling on or off (requires PROFILE_ADMIN_TOKEN)
+
+    Request body (POST):
+    {
+        "action": "start" | "stop" | "snapshot",
+        "sample_interval_ms": float,   # start only, 0 disables the sampler
+        "request_rate": float (0-1),   # start only, fraction of requests under cProfile
+        "tracemalloc": bool            # start only
+    }
+    """
+    rejected = profiling.check_admin_token(request.headers.get('X-Admin-Token'))
+    if rejected:
+        return jsonify({
+            'success': False,
+            'error': 'Endpoint not found' if rejected == 404 else 'Invalid admin token'
+        }), rejected
+
+    if request.method == 'GET':
+        return jsonify({'success': True, 'data': profiling.profiler.status()}), 200
+
+    result, error = profiling.run_admin_action(request.get_json(silent=True))
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    return jsonify({'success': True, 'data': result}), 200
+
+profiling.profiler.attach(app.view_functions, PROFILED_ENDPOINTS)
+
 # Global variable to store latest sensor data
 latest_sensor_data = {}
 
@@ -317,8 +403,12 @@ def receive_sensor_data():
         "soil_moisture": float,
         "temperature": float,
         "humidity": float,
-        "rain_value": float (optional)
+        "rain_value": float (optional),
+        "device_id": string (optional, defaults to "default")
     }
+
+    The response carries the irrigation scheduler's pump command for the
+    device, based on this reading and its recent history.
     """
     try:
         data = request.get_json()
@@ -343,11 +433,23 @@ def receive_sensor_data():
 
         print(f"[SENSOR DATA] Received: {latest_sensor_data}")
 
+        pump_command = irrigation.ingest_reading(str(data.get('device_id', 'default')), {
+            **latest_sensor_data,
+            # A device without a rain sensor must not look like it is raining
+            'rain_value': float(data['rain_value']) if 'rain_value' in data else float('nan')
+        })
+
         return jsonify({
             'success': True,
-            'message': 'Sensor data received successfully'
+            'message': 'Sensor data received successfully',
+            'pump_command': pump_command
         }), 200
 
+    except (InferenceTimeout, irrigation.ServiceUnavailable) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
     except Exception as e:
         return jsonify({
             'success': False,
@@ -393,7 +495,7 @@ def not_found(error):
     except Exception:
         body = '<unavailable>'
     try:
-        headers = dict(request.headers)
+        headers = loggable_headers()
     except Exception:
         headers = {}
     print(f"[404] {request.method} {request.path} Remote: {request.remote_addr} Headers: {headers} Body: {body}")
@@ -410,7 +512,7 @@ def method_not_allowed(error):
     except Exception:
         body = '<unavailable>'
     try:
-        headers = dict(request.headers)
+        headers = loggable_headers()
     except Exception:
         headers = {}
     print(f"[405] {request.method} {request.path} Remote: {request.remote_addr} Headers: {headers} Body: {body}")
@@ -435,5 +537,11 @@ if __name__ == '__main__':
     print("  - POST /api/recommend")
     print("  - GET  /api/crops")
     print("  - GET  /api/stats")
-    
+    print("  - GET  /api/startup")
+    print("For production use: gunicorn -c gunicorn.conf.py wsgi:app")
+
+    # Load, warm up and flatten the forest for /api/recommend/explain up front
+    if recommender.startup():
+        explain.prepare()
+    profiling.install_signal_handler()
     app.run(debug=False, host='0.0.0.0', port=5000)
@@ -0,0 +1,541 @@
+"""
+Crop Recommendation System - ASGI Backend API
+Async variant of app.py for I/O-bound sensor traffic. Serves the same
+routes with the same success/data/error envelope and validation, runs the
+CPU-bound model inference in a bounded thread pool so it never blocks the
+event loop, and adds a Server-Sent Events stream for sensor subscribers.
+
+Usage:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000 --timeout-keep-alive 75
+"""
+
+import time
+_import_started = time.perf_counter()
+
+import asyncio
+import contextlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse as BaseJSONResponse, StreamingResponse
+from starlette.routing import Route
+
+import explain
+import irrigation
+import profiling
+import recommender
+import sweep
+from batching import RESULT_TIMEOUT, InferenceTimeout
+from json_provider import NDJSON_MIMETYPE, dumps_bytes, dumps_ndjson_line, wants_ndjson
+
+recommender.record_startup_phase('import', time.perf_counter() - _import_started)
+
+class JSONResponse(BaseJSONResponse):
+    """JSON response encoded with orjson (stdlib fallback), NumPy-aware"""
+
+    def render(self, content):
+        return dumps_bytes(content)
+
+# Inference pool: at most INFERENCE_WORKERS predictions run at once, and at
+# most INFERENCE_QUEUE_LIMIT wait for a slot. Beyond that, requests are
+# rejected with 503 instead of piling up behind the CPU-bound work.
+INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', os.cpu_count() or 1))
+INFERENCE_QUEUE_LIMIT = int(os.environ.get('INFERENCE_QUEUE_LIMIT', INFERENCE_WORKERS * 32))
+
+# Per-subscriber buffer for the sensor stream; slow readers drop old readings
+SUBSCRIBER_QUEUE_SIZE = 16
+# Seconds between keep-alive comments on idle sensor streams
+STREAM_KEEPALIVE = 15
+
+inference_executor = ThreadPoolExecutor(
+    max_workers=INFERENCE_WORKERS,
+    thread_name_prefix='inference'
+)
+inference_slots = None
+
+# Latest sensor reading and the queues of connected stream subscribers
+latest_sensor_data = {}
+sensor_subscribers = set()
+
+async def run_inference(func, *args):
+    """Run a CPU-bound call in the bounded inference pool"""
+    if inference_slots.locked():
+        raise HTTPException(status_code=503, detail='Inference queue full, retry later')
+    async with inference_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(inference_executor, func, *args)
+
+async def run_batched(values):
+    """Queue one row on the micro-batcher, under the same slot limit as run_inference"""
+    if inference_slots.locked():
+        raise HTTPException(status_code=503, detail='Inference queue full, retry later')
+    async with inference_slots:
+        # The batcher thread does the CPU work; just await this row's result
+        return await await_batched(recommender.batcher.submit(values))
+
+async def await_batched(future):
+    """
+    Await a batcher future for at most RESULT_TIMEOUT seconds
+
+    On timeout the future is cancelled (so its row is not scored) and the
+    request fails with 503, as InferenceBatcher.predict does for app.py.
+    """
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), RESULT_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail=str(InferenceTimeout(RESULT_TIMEOUT))) from None
+
+async def read_json(request):
+    """Parse a JSON request body, returning None when it is missing or invalid"""
+    try:
+        return await request.json()
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+async def health(request):
+    """Health check endpoint (returns 503 until warmup inference has run)"""
+    return JSONResponse({
+        'success': recommender.model_ready,
+        'message': 'Crop Recommendation API is running' if recommender.model_ready
+                   else 'Crop Recommendation API is warming up',
+        'timestamp': datetime.now().isoformat(),
+        'model_status': 'loaded' if recommender.model else 'not_loaded',
+        'ready': recommender.model_ready,
+        'pid': os.getpid()
+    }, status_code=200 if recommender.model_ready else 503)
+
+async def startup_profile(request):
+    """Startup profile: time spent importing, loading the models and warming up"""
+    return JSONResponse({
+        'success': True,
+        'data': recommender.get_startup_profile()
+    }, status_code=200)
+
+async def recommend(request):
+    """Get crop recommendation based on soil and climate parameters"""
+    try:
+        if not recommender.models_loaded():
+            return JSONResponse({
+                'success': False,
+                'error': 'Models not loaded'
+            }, status_code=500)
+
+        # Get request data: accept JSON body for POST or query params for GET
+        if request.method == 'GET':
+            # If no query params provided, return usage/help
+            if not request.query_params:
+                return JSONResponse({
+                    'success': False,
+                    'error': 'Provide parameters via POST JSON body or GET query string. Example:',
+                    'example_get': '/api/recommend?N=90&P=40&K=40&temperature=21.5&humidity=82&ph=6.5&rainfall=202'
+                }, status_code=200)
+            data = dict(request.query_params)
+        else:
+            data = await read_json(request)
+
+        values, error = recommender.validate_recommend_input(data)
+        if error:
+            return JSONResponse({
+                'success': False,
+                'error': error
+            }, status_code=400)
+
+        if recommender.batcher is not None:
+            probabilities = await run_batched(values)
+            data = recommender.build_recommendation(values, probabilities)
+        else:
+            data = await run_inference(recommender.recommend_crop, values)
+
+        return JSONResponse({
+            'success': True,
+            'data': data
+        }, status_code=200)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        return JSONResponse({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }, status_code=500)
+
+async def recommend_batch(request):
+    """Get crop recommendations for many inputs in one call"""
+    try:
+        if not recommender.models_loaded():
+            return JSONResponse({
+                'success': False,
+                'error': 'Models not loaded'
+            }, status_code=500)
+
+        data = await read_json(request)
+        records = data.get('inputs') if isinstance(data, dict) else data
+        if not isinstance(records, list) or not records:
+            return JSONResponse({
+                'success': False,
+                'error': 'Request body must contain a non-empty "inputs" list'
+            }, status_code=400)
+        stream = wants_ndjson(request.headers.get('accept'), request.query_params.get('stream'))
+        max_rows = recommender.MAX_STREAM_ROWS if stream else recommender.MAX_BATCH_ROWS
+        if len(records) > max_rows:
+            return JSONResponse({
+                'success': False,
+                'error': f'Too many inputs: at most {max_rows} per request'
+            }, status_code=400)
+
+        if stream:
+            return StreamingResponse(stream_ndjson(records), media_type=NDJSON_MIMETYPE)
+
+        results = await run_inference(recommender.recommend_batch, records)
+        return JSONResponse({
+            'success': True,
+            'data': {
+                'count': len(results),
+                'valid': sum(1 for r in results if r['success']),
+                'results': results
+            }
+        }, status_code=200)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        return JSONResponse({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }, status_code=500)
+
+async def recommend_explain(request):
+    """Explain a crop recommendation (same input as /api/recommend)"""
+    try:
+        if not recommender.models_loaded():
+            return JSONResponse({
+                'success': False,
+                'error': 'Models not loaded'
+            }, status_code=500)
+
+        data = dict(request.query_params) if request.method == 'GET' else await read_json(request)
+        values, error = recommender.validate_recommend_input(data)
+        if error:
+            return JSONResponse({
+                'success': False,
+                'error': error
+            }, status_code=400)
+
+        return JSONResponse({
+            'success': True,
+            'data': await run_inference(explain.explain_one, values)
+        }, status_code=200)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        return JSONResponse({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }, status_code=500)
+
+async def recommend_explain_batch(request):
+    """Explain recommendations for many inputs in one vectorized pass"""
+    try:
+        if not recommender.models_loaded():
+            return JSONResponse({
+                'success': False,
+                'error': 'Models not loaded'
+            }, status_code=500)
+
+        data = await read_json(request)
+        records = data.get('inputs') if isinstance(data, dict) else data
+        if not isinstance(records, list) or not records:
+            return JSONResponse({
+                'success': False,
+                'error': 'Request body must contain a non-empty "inputs" list'
+            }, status_code=400)
+        if len(records) > recommender.MAX_BATCH_ROWS:
+            return JSONResponse({
+                'success': False,
+                'error': f'Too many inputs: at most {recommender.MAX_BATCH_ROWS} per request'
+            }, status_code=400)
+
+        results = await run_inference(explain.explain_batch, records)
+        return JSONResponse({
+            'success': True,
+            'data': {
+                'count': len(results),
+                'valid': sum(1 for r in results if r['success']),
+                'results': results
+            }
+        }, status_code=200)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        return JSONResponse({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }, status_code=500)
+
+async def recommend_sweep(request):
+    """What-if sweep over one or two features (see sweep.py)"""
+    try:
+        if not recommender.models_loaded():
+            return JSONResponse({
+                'success': False,
+                'error': 'Models not loaded'
+            }, status_code=500)
+
+        spec, error = sweep.parse_sweep_request(await read_json(request))
+        if error:
+            return JSONResponse({
+                'success': False,
+                'error': error
+            }, status_code=400)
+
+        return JSONResponse({
+            'success': True,
+            'data': await run_inference(sweep.run_sweep, spec)
+        }, status_code=200)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        return JSONResponse({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }, status_code=500)
+
+async def stream_ndjson(records):
+    """Yield batch results as NDJSON lines, scoring one chunk at a time in the inference pool"""
+    chunk_size = recommender.STREAM_CHUNK_ROWS
+    try:
+        for start in range(0, len(records), chunk_size):
+            chunk = records[start:start + chunk_size]
+            results = await run_inference(recommender.recommend_batch, chunk)
+            yield b''.join(dumps_ndjson_line({**r, 'index': start + r['index']}) for r in results)
+    except Exception as e:
+        yield dumps_ndjson_line({'success': False, 'error': f'Server error: {str(e)}'})
+
+async def get_crops(request):
+    """Get list of all available crops with their information"""
+    return JSONResponse({
+        'success': True,
+        'data': recommender.get_crops()
+    }, status_code=200)
+
+async def get_stats(request):
+    """Get API statistics"""
+    return JSONResponse({
+        'success': True,
+        'data': recommender.get_stats()
+    }, status_code=200)
+
+async def get_metrics(request):
+    """Get inference and sensor-ingest batching metrics (batch sizes and queueing latency)"""
+    return JSONResponse({
+        'success': True,
+        'data': {
+            'batching': recommender.get_batching_metrics(),
+            'irrigation': irrigation.get_ingest_metrics()
+        }
+    }, status_code=200)
+
+async def admin_profiling(request):
+    """
+    Turn on-demand profiling on or off (requires PROFILE_ADMIN_TOKEN)
+
+    Same request body as app.py. The sampling profiler and tracemalloc cover
+    this process; per-request cProfile capture applies to the Flask views.
+    """
+    rejected = profiling.check_admin_token(request.headers.get('X-Admin-Token'))
+    if rejected:
+        return JSONResponse({
+            'success': False,
+            'error': 'Endpoint not found' if rejected == 404 else 'Invalid admin token'
+        }, status_code=rejected)
+
+    if request.method == 'GET':
+        return JSONResponse({'success': True, 'data': profiling.profiler.status()}, status_code=200)
+
+    data = await read_json(request)
+    # Stopping joins the sampler thread and writes files: keep it off the event loop
+    loop = asyncio.get_running_loop()
+    result, error = await loop.run_in_executor(None, profiling.run_admin_action, data)
+    if error:
+        return JSONResponse({'success': False, 'error': error}, status_code=400)
+    return JSONResponse({'success': True, 'data': result}, status_code=200)
+
+async def receive_sensor_data(request):
+    """
+    Receive sensor data from IoT devices, fan it out to subscribers and
+    return the irrigation scheduler's pump command for the device
+    """
+    global latest_sensor_data
+    try:
+        data = await read_json(request)
+
+        # Validate required fields
+        required_fields = ['timestamp', 'soil_moisture', 'temperature', 'humidity']
+        if not all(field in data for field in required_fields):
+            return JSONResponse({
+                'success': False,
+                'error': 'Missing required fields: ' + ', '.join(required_fields)
+            }, status_code=400)
+
+        latest_sensor_data = {
+            'timestamp': data['timestamp'],
+            'soil_moisture': float(data['soil_moisture']),
+            'temperature': float(data['temperature']),
+            'humidity': float(data['humidity']),
+            'rain_value': float(data.get('rain_value', 0))
+        }
+        publish_sensor_data(latest_sensor_data)
+
+        # Concurrent readings are coalesced into one vectorized scheduler update
+        pump_command = await await_batched(irrigation.submit_reading(str(data.get('device_id', 'default')), {
+            **latest_sensor_data,
+            # A device without a rain sensor must not look like it is raining
+            'rain_value': float(data['rain_value']) if 'rain_value' in data else float('nan')
+        }))
+
+        return JSONResponse({
+            'success': True,
+            'message': 'Sensor data received successfully',
+            'pump_command': pump_command
+        }, status_code=200)
+
+    except HTTPException:
+        raise
+    except (InferenceTimeout, irrigation.ServiceUnavailable) as e:
+        return JSONResponse({
+            'success': False,
+            'error': str(e)
+        }, status_code=503)
+    except Exception as e:
+        return JSONResponse({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }, status_code=500)
+
+async def get_sensor_data(request):
+    """Get the latest sensor data"""
+    if not latest_sensor_data:
+        return JSONResponse({
+            'success': False,
+            'error': 'No sensor data available'
+        }, status_code=404)
+
+    return JSONResponse({
+        'success': True,
+        'data': latest_sensor_data
+    }, status_code=200)
+
+def publish_sensor_data(reading):
+    """Push a reading to every subscriber, dropping the oldest one if a queue is full"""
+    for queue in sensor_subscribers:
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(reading)
+
+async def stream_sensor_data(request):
+    """
+    Server-Sent Events stream of sensor readings
+
+    Each connected client holds one idle coroutine and a small queue, so a
+    single process can keep thousands of subscribers open.
+    """
+    queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    sensor_subscribers.add(queue)
+
+    async def events():
+        try:
+            if latest_sensor_data:
+                yield b'data: ' + dumps_bytes(latest_sensor_data) + b'\n\n'
+            while True:
+                try:
+                    reading = await asyncio.wait_for(queue.get(), timeout=STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield b': keep-alive\n\n'
+                    continue
+                yield b'data: ' + dumps_bytes(reading) + b'\n\n'
+        finally:
+            sensor_subscribers.discard(queue)
+
+    return StreamingResponse(events(), media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+async def sensor_data(request):
+    """Dispatch /api/sensor-data by method (GET reads, POST ingests)"""
+    if request.method == 'POST':
+        return await receive_sensor_data(request)
+    return await get_sensor_data(request)
+
+async def _routes(request):
+    """Debug helper: list registered routes (for troubleshooting only)"""
+    return JSONResponse({'success': True, 'routes': [route.path for route in routes]}, status_code=200)
+
+async def http_error(request, exc):
+    """Return 404/405/503 errors in the API envelope"""
+    messages = {404: 'Endpoint not found', 405: 'Method not allowed'}
+    return JSONResponse({
+        'success': False,
+        'error': messages.get(exc.status_code, exc.detail)
+    }, status_code=exc.status_code)
+
+async def internal_error(request, exc):
+    """Handle 500 errors"""
+    return JSONResponse({
+        'success': False,
+        'error': 'Internal server error'
+    }, status_code=500)
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    """Load and warm up the model before the server starts accepting requests"""
+    global inference_slots
+    inference_slots = asyncio.Semaphore(INFERENCE_WORKERS + INFERENCE_QUEUE_LIMIT)
+    profiling.install_signal_handler()
+    loop = asyncio.get_running_loop()
+    if await loop.run_in_executor(inference_executor, recommender.startup):
+        await loop.run_in_executor(inference_executor, explain.prepare)
+    yield
+    # Flush any profiles still being collected
+    profiling.profiler.stop()
+    inference_executor.shutdown(wait=False, cancel_futures=True)
+
+routes = [
+    Route('/api/health', health, methods=['GET']),
+    Route('/api/startup', startup_profile, methods=['GET']),
+    Route('/api/recommend', recommend, methods=['GET', 'POST']),
+    Route('/api/recommend/batch', recommend_batch, methods=['POST']),
+    Route('/api/recommend/explain', recommend_explain, methods=['GET', 'POST']),
+    Route('/api/recommend/explain/batch', recommend_explain_batch, methods=['POST']),
+    Route('/api/recommend/sweep', recommend_sweep, methods=['POST']),
+    Route('/api/recommendation', recommend, methods=['POST']),
+    Route('/api/crops', get_crops, methods=['GET']),
+    Route('/api/stats', get_stats, methods=['GET']),
+    Route('/api/metrics', get_metrics, methods=['GET']),
+    Route('/api/admin/profiling', admin_profiling, methods=['GET', 'POST']),
+    Route('/api/sensor-data', sensor_data, methods=['GET', 'POST']),
+    Route('/api/sensor-data/stream', stream_sensor_data, methods=['GET']),
+    Route('/api/_routes', _routes, methods=['GET']),
+]
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    exception_handlers={HTTPException: http_error, 500: internal_error},
+    lifespan=lifespan,
+)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("[INFO] Starting Crop Recommendation API (ASGI)...")
+    print("API running on http://localhost:5000")
+    uvicorn.run(app, host='0.0.0.0', port=5000, timeout_keep_alive=75, log_level='warning')
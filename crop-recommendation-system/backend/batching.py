@@ -0,0 +1,165 @@
+"""
+Crop Recommendation System - Micro-batching Inference Scheduler
+Coalesces concurrent single-row predictions into one vectorized call.
+
+Callers submit one feature row each. A background thread collects rows
+for up to max_wait_ms (or until max_batch rows are queued), stacks them
+into one matrix, runs the predict function once and hands every caller
+its own row of the result.
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+# Number of recent queue-wait samples kept for the latency percentiles
+WAIT_SAMPLE_SIZE = 2048
+# Longest time predict() waits for its result before giving up
+RESULT_TIMEOUT = float(os.environ.get('BATCH_RESULT_TIMEOUT', 30))
+
+class InferenceTimeout(TimeoutError):
+    """A queued row was not scored within the caller's timeout (served as a 503)"""
+
+    def __init__(self, timeout):
+        super().__init__(f'Inference timed out after {timeout:g}s, retry later')
+
+def _resolve(setter, value):
+    """Set a future's result or exception without letting a failure kill the collector thread"""
+    try:
+        setter(value)
+    except InvalidStateError:
+        pass
+
+class InferenceBatcher:
+    """Queue single-row requests and run them as vectorized batches"""
+
+    def __init__(self, predict_fn, max_batch=32, max_wait_ms=2.0, stack_fn=None, name='inference-batcher'):
+        """
+        predict_fn: callable taking an (n, n_features) array and returning
+                    an (n, ...) array with one result row per input row
+        max_batch: largest number of rows run in one call
+        max_wait_ms: longest time the first queued row waits for company
+                     (0 still coalesces rows that queued up meanwhile)
+        stack_fn: builds predict_fn's input from the list of queued rows
+                  (default: a float NumPy matrix)
+        """
+        self.predict_fn = predict_fn
+        self.stack_fn = stack_fn or (lambda rows: np.array(rows, dtype=float))
+        self.name = name
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        # Metrics
+        self._batches = 0
+        self._rows = 0
+        self._batch_sizes = {}
+        self._waits_ms = deque(maxlen=WAIT_SAMPLE_SIZE)
+
+    def _ensure_worker(self):
+        """Start the collector thread (again after a fork, where threads do not survive)"""
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # Inherited from the parent process: drop its queue and counters
+                self._queue = queue.Queue()
+                self._batches = self._rows = 0
+                self._batch_sizes = {}
+                self._waits_ms.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def submit(self, row):
+        """Queue one feature row and return a Future for its result row"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((row, future, time.perf_counter()))
+        return future
+
+    def predict(self, row, timeout=RESULT_TIMEOUT):
+        """
+        Submit one row and block until its result row is available
+
+        Raises InferenceTimeout after timeout seconds; the row is cancelled
+        so the collector does not score it for a caller that gave up.
+        """
+        future = self.submit(row)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise InferenceTimeout(timeout) from None
+
+    def _collect(self):
+        """Block for the first row, then gather more until the batch is full or the wait expires"""
+        items = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(items) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    items.append(self._queue.get_nowait())
+                else:
+                    items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            # Drop rows whose caller cancelled while queued; the rest can no
+            # longer be cancelled, so resolving them below cannot fail
+            items = [item for item in self._collect() if item[1].set_running_or_notify_cancel()]
+            if not items:
+                continue
+            started = time.perf_counter()
+            try:
+                results = self.predict_fn(self.stack_fn([item[0] for item in items]))
+            except Exception as e:
+                for _, future, _ in items:
+                    _resolve(future.set_exception, e)
+                continue
+
+            for i, (_, future, _) in enumerate(items):
+                _resolve(future.set_result, results[i])
+
+            size = len(items)
+            with self._lock:
+                self._batches += 1
+                self._rows += size
+                self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+                self._waits_ms.extend((started - item[2]) * 1000.0 for item in items)
+
+    def metrics(self):
+        """Batch-size histogram and queueing latency added by the scheduler"""
+        with self._lock:
+            waits = np.array(self._waits_ms) if self._waits_ms else np.zeros(1)
+            return {
+                'enabled': True,
+                'max_batch': self.max_batch,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'batches': self._batches,
+                'rows': self._rows,
+                'mean_batch_size': self._rows / self._batches if self._batches else 0.0,
+                'batch_sizes': {str(size): count for size, count in sorted(self._batch_sizes.items())},
+                'queue_wait_ms': {
+                    'mean': float(waits.mean()),
+                    'p50': float(np.percentile(waits, 50)),
+                    'p95': float(np.percentile(waits, 95)),
+                    'p99': float(np.percentile(waits, 99)),
+                    'max': float(waits.max())
+                }
+            }
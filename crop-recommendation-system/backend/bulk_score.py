@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Crop Recommendation System - Offline Bulk Scoring
+Scores large soil-test exports (CSV or Parquet) with the same artifacts
+as the API (crop_recommendation_model.pkl, feature_scaler.pkl,
+label_encoder.pkl).
+
+The input is read in chunks, chunks are scored in parallel worker
+processes (each loads the artifacts once) and results are appended to the
+output as they complete, so memory stays bounded by
+chunk size x in-flight chunks regardless of the file size.
+
+Usage:
+    python bulk_score.py soil_cards.csv scored.csv
+    python bulk_score.py soil_cards.csv scored.parquet --workers 8 --chunk-size 100000
+"""
+
+import argparse
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+import schema
+from crop_catalog import class_names
+from recommender import MODEL_PATH, SCALER_PATH, ENCODER_PATH
+
+OUTPUT_COLUMNS = [
+    'recommendation', 'confidence',
+    'top1', 'top1_confidence',
+    'top2', 'top2_confidence',
+    'top3', 'top3_confidence',
+    'error'
+]
+
+# Artifacts loaded once per worker process by _init_worker
+_model = _scaler = _classes = None
+
+def _init_worker(model_path, scaler_path, encoder_path):
+    global _model, _scaler, _classes
+    with open(model_path, 'rb') as f:
+        _model = pickle.load(f)
+    with open(scaler_path, 'rb') as f:
+        _scaler = pickle.load(f)
+    with open(encoder_path, 'rb') as f:
+        label_encoder = pickle.load(f)
+    # Crop name for each column of predict_proba
+    _classes = np.asarray(class_names(_model, label_encoder), dtype=object)
+
+def resolve_columns(columns):
+    """Map each model feature to the input column holding it (case-insensitive)"""
+    lookup = {str(c).strip().lower(): c for c in columns}
+    missing = [name for name in schema.FEATURE_NAMES if name.lower() not in lookup]
+    if missing:
+        raise ValueError(f"Input is missing feature columns: {', '.join(missing)}")
+    return [lookup[name.lower()] for name in schema.FEATURE_NAMES]
+
+def score_chunk(matrix):
+    """
+    Validate and score an (n, 7) feature matrix
+
+    Returns a dict of output column arrays; invalid rows get an empty
+    recommendation and the same error message the API would return.
+    """
+    n = len(matrix)
+    errors = {int(row): schema.INVALID_TYPE_ERROR for row in np.flatnonzero(np.isnan(matrix).any(axis=1))}
+    valid, errors = schema.validate_batch(matrix, errors)
+
+    out = {
+        'recommendation': np.full(n, '', dtype=object),
+        'confidence': np.full(n, np.nan),
+        'error': np.full(n, '', dtype=object),
+    }
+    for rank in range(1, 4):
+        out[f'top{rank}'] = np.full(n, '', dtype=object)
+        out[f'top{rank}_confidence'] = np.full(n, np.nan)
+
+    if valid.any():
+        probabilities = _model.predict_proba(_scaler.transform(matrix[valid]))
+        # Top 3 classes per row, best first; the stable sort breaks ties
+        # towards the lowest class index, like np.argmax in the API
+        top = np.argsort(-probabilities, axis=1, kind='stable')[:, :3]
+        top_probs = np.take_along_axis(probabilities, top, axis=1)
+
+        out['recommendation'][valid] = _classes[top[:, 0]]
+        out['confidence'][valid] = top_probs[:, 0]
+        for rank in range(3):
+            out[f'top{rank + 1}'][valid] = _classes[top[:, rank]]
+            out[f'top{rank + 1}_confidence'][valid] = top_probs[:, rank]
+
+    for row, message in errors.items():
+        out['error'][row] = message
+    return out
+
+def _score_frame(frame, feature_columns):
+    """Worker entry point: score one input chunk and return it with the output columns appended"""
+    matrix = frame[feature_columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    scored = score_chunk(matrix)
+    return frame.assign(**{name: scored[name] for name in OUTPUT_COLUMNS})
+
+def read_chunks(path, chunk_size):
+    """
+    Yield DataFrame chunks from a CSV or Parquet file
+
+    CSV columns are read as text, so a column's type cannot change from one
+    chunk to the next (e.g. a sparse column that is empty in the first
+    chunk); feature columns are converted to numbers when scored.
+    """
+    if path.lower().endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype=str)
+
+class ChunkWriter:
+    """Append scored chunks to a CSV or Parquet file"""
+
+    def __init__(self, path, parquet=None):
+        self.path = path
+        self.parquet = path.lower().endswith('.parquet') if parquet is None else parquet
+        self._writer = None
+        self._schema = None
+        self._header = True
+
+    def _parquet_schema(self, frame):
+        """Schema of the first chunk, with all-empty (null-typed) columns typed as strings"""
+        import pyarrow as pa
+        schema = pa.Schema.from_pandas(frame, preserve_index=False)
+        for i, field in enumerate(schema):
+            if pa.types.is_null(field.type):
+                schema = schema.set(i, field.with_type(pa.string()))
+        return schema
+
+    def write(self, frame):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self._writer is None:
+                self._schema = self._parquet_schema(frame)
+                self._writer = pq.ParquetWriter(self.path, self._schema)
+            # Every chunk is converted with the first chunk's schema
+            self._writer.write_table(pa.Table.from_pandas(frame, schema=self._schema, preserve_index=False))
+        else:
+            frame.to_csv(self.path, mode='w' if self._header else 'a', header=self._header, index=False)
+            self._header = False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+def score_file(input_path, output_path, workers=None, chunk_size=50000, artifact_dir='.'):
+    """
+    Score input_path into output_path and return a throughput report
+
+    At most 2 x workers chunks are in flight at once; results are written
+    in input order to a temporary file that replaces output_path only once
+    every chunk has been scored, so a failed run leaves no truncated output.
+    """
+    workers = workers or os.cpu_count() or 1
+    artifacts = [os.path.join(artifact_dir, p) for p in (MODEL_PATH, SCALER_PATH, ENCODER_PATH)]
+    missing = [path for path in artifacts if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"Model artifacts not found: {', '.join(missing)} (run the training notebook first)")
+    partial_path = output_path + '.partial'
+    writer = ChunkWriter(partial_path, parquet=output_path.lower().endswith('.parquet'))
+    rows = invalid = chunks = 0
+    feature_columns = None
+    completed = False
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=artifacts) as pool:
+        pending = []
+        try:
+            for frame in read_chunks(input_path, chunk_size):
+                if feature_columns is None:
+                    feature_columns = resolve_columns(frame.columns)
+                pending.append(pool.submit(_score_frame, frame, feature_columns))
+
+                # Bound memory: wait for the oldest chunk once enough are in flight
+                while len(pending) >= 2 * workers:
+                    scored = pending.pop(0).result()
+                    writer.write(scored)
+                    rows += len(scored)
+                    invalid += int((scored['error'] != '').sum())
+                    chunks += 1
+
+            for future in pending:
+                scored = future.result()
+                writer.write(scored)
+                rows += len(scored)
+                invalid += int((scored['error'] != '').sum())
+                chunks += 1
+            completed = True
+        finally:
+            writer.close()
+            if completed:
+                os.replace(partial_path, output_path)
+            elif os.path.exists(partial_path):
+                os.remove(partial_path)
+    elapsed = time.perf_counter() - started
+
+    rows_per_sec = rows / elapsed if elapsed > 0 else 0.0
+    return {
+        'input': input_path,
+        'output': output_path,
+        'rows': rows,
+        'invalid_rows': invalid,
+        'chunks': chunks,
+        'workers': workers,
+        'elapsed_seconds': elapsed,
+        'rows_per_second': rows_per_sec,
+        'rows_per_second_per_core': rows_per_sec / workers
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score soil-test CSV/Parquet files with the crop recommendation model')
+    parser.add_argument('input', help='input .csv or .parquet file with N, P, K, temperature, humidity, ph, rainfall columns')
+    parser.add_argument('output', help='output .csv or .parquet file')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU cores)')
+    parser.add_argument('--chunk-size', type=int, default=50000, help='rows per chunk (default: 50000)')
+    parser.add_argument('--artifact-dir', default=os.path.dirname(os.path.abspath(__file__)),
+                        help='directory holding the .pkl artifacts (default: this directory)')
+    args = parser.parse_args(argv)
+
+    try:
+        report = score_file(args.input, args.output, args.workers, args.chunk_size, args.artifact_dir)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"[ERROR] {e}")
+        return 1
+    except BrokenProcessPool as e:
+        print(f"[ERROR] A worker process failed (could it load the model artifacts?): {e}")
+        return 1
+    except (OSError, ImportError, pickle.UnpicklingError) as e:
+        print(f"[ERROR] {type(e).__name__}: {e}")
+        return 1
+
+    print(f"[OK] Scored {report['rows']:,} rows ({report['invalid_rows']:,} invalid) "
+          f"in {report['chunks']} chunks -> {report['output']}")
+    print(f"[INFO] {report['elapsed_seconds']:.2f}s, {report['rows_per_second']:,.0f} rows/sec, "
+          f"{report['rows_per_second_per_core']:,.0f} rows/sec per core ({report['workers']} workers)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
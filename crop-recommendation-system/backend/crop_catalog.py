@@ -0,0 +1,246 @@
+"""
+Crop Recommendation System - Crop Catalog
+Growing-condition information for every crop the model can recommend,
+indexed by the model's class id (the column order of predict_proba).
+
+The catalog is built once at startup and validated against
+models/model_metadata.json, so the request path maps a class index to its
+crop name and information by plain list indexing.
+"""
+
+import json
+import os
+
+METADATA_PATH = os.path.join('models', 'model_metadata.json')
+
+UNKNOWN_CROP_INFO = {'error': 'Crop information not available'}
+
+# Crop information database, keyed by the label encoder's crop names
+CROP_INFO = {
+    'apple': {
+        'optimal_temperature': '21-24°C',
+        'optimal_humidity': '90-95%',
+        'optimal_rainfall': '100-125mm',
+        'ph_range': '5.5-6.5',
+        'season': 'Perennial (temperate)',
+        'soil_type': 'Well-drained loamy soil rich in organic matter'
+    },
+    'banana': {
+        'optimal_temperature': '25-30°C',
+        'optimal_humidity': '75-85%',
+        'optimal_rainfall': '90-120mm',
+        'ph_range': '5.5-6.5',
+        'season': 'Year-round',
+        'soil_type': 'Deep, rich, well-drained loamy soil'
+    },
+    'blackgram': {
+        'optimal_temperature': '25-35°C',
+        'optimal_humidity': '60-70%',
+        'optimal_rainfall': '60-75mm',
+        'ph_range': '6.5-7.8',
+        'season': 'Kharif',
+        'soil_type': 'Well-drained loamy soil'
+    },
+    'chickpea': {
+        'optimal_temperature': '17-21°C',
+        'optimal_humidity': '14-20%',
+        'optimal_rainfall': '65-95mm',
+        'ph_range': '6.0-9.0',
+        'season': 'Rabi',
+        'soil_type': 'Sandy loam to clay loam, well-drained'
+    },
+    'coconut': {
+        'optimal_temperature': '25-30°C',
+        'optimal_humidity': '90-100%',
+        'optimal_rainfall': '130-225mm',
+        'ph_range': '5.5-6.5',
+        'season': 'Perennial',
+        'soil_type': 'Sandy loam or laterite soil, well-drained'
+    },
+    'coffee': {
+        'optimal_temperature': '23-28°C',
+        'optimal_humidity': '50-70%',
+        'optimal_rainfall': '115-200mm',
+        'ph_range': '6.0-7.5',
+        'season': 'Perennial',
+        'soil_type': 'Well-drained loamy soil rich in humus'
+    },
+    'cotton': {
+        'optimal_temperature': '21-30°C',
+        'optimal_humidity': '40-60%',
+        'optimal_rainfall': '50-150mm',
+        'ph_range': '6.0-7.5',
+        'season': 'Kharif',
+        'soil_type': 'Well-drained loamy to clayey soil'
+    },
+    'grapes': {
+        'optimal_temperature': '15-35°C',
+        'optimal_humidity': '80-84%',
+        'optimal_rainfall': '65-75mm',
+        'ph_range': '5.5-6.5',
+        'season': 'Perennial',
+        'soil_type': 'Well-drained sandy loam soil'
+    },
+    'jute': {
+        'optimal_temperature': '23-27°C',
+        'optimal_humidity': '70-90%',
+        'optimal_rainfall': '150-200mm',
+        'ph_range': '6.0-7.5',
+        'season': 'Kharif',
+        'soil_type': 'Alluvial loamy soil'
+    },
+    'kidneybeans': {
+        'optimal_temperature': '15-25°C',
+        'optimal_humidity': '18-25%',
+        'optimal_rainfall': '60-150mm',
+        'ph_range': '5.5-6.0',
+        'season': 'Rabi',
+        'soil_type': 'Well-drained loamy soil'
+    },
+    'lentil': {
+        'optimal_temperature': '18-30°C',
+        'optimal_humidity': '40-70%',
+        'optimal_rainfall': '35-55mm',
+        'ph_range': '5.9-7.8',
+        'season': 'Rabi',
+        'soil_type': 'Well-drained loamy soil'
+    },
+    'maize': {
+        'optimal_temperature': '21-27°C',
+        'optimal_humidity': '60-80%',
+        'optimal_rainfall': '60-200mm',
+        'ph_range': '6.0-8.0',
+        'season': 'Kharif',
+        'soil_type': 'Well-drained fertile loamy soil'
+    },
+    'mango': {
+        'optimal_temperature': '27-36°C',
+        'optimal_humidity': '45-55%',
+        'optimal_rainfall': '89-101mm',
+        'ph_range': '4.5-7.0',
+        'season': 'Perennial (fruits in summer)',
+        'soil_type': 'Deep, well-drained alluvial or lateritic soil'
+    },
+    'mothbeans': {
+        'optimal_temperature': '24-32°C',
+        'optimal_humidity': '40-65%',
+        'optimal_rainfall': '30-75mm',
+        'ph_range': '3.5-9.5',
+        'season': 'Kharif',
+        'soil_type': 'Sandy, light soil; drought tolerant'
+    },
+    'mungbean': {
+        'optimal_temperature': '27-30°C',
+        'optimal_humidity': '80-90%',
+        'optimal_rainfall': '36-60mm',
+        'ph_range': '6.2-7.2',
+        'season': 'Kharif / Zaid',
+        'soil_type': 'Well-drained loamy to sandy loam soil'
+    },
+    'muskmelon': {
+        'optimal_temperature': '27-30°C',
+        'optimal_humidity': '90-95%',
+        'optimal_rainfall': '20-30mm',
+        'ph_range': '6.0-6.8',
+        'season': 'Zaid (summer)',
+        'soil_type': 'Sandy loam, well-drained'
+    },
+    'orange': {
+        'optimal_temperature': '10-35°C',
+        'optimal_humidity': '90-95%',
+        'optimal_rainfall': '100-120mm',
+        'ph_range': '6.0-8.0',
+        'season': 'Perennial',
+        'soil_type': 'Light loamy, well-drained soil'
+    },
+    'papaya': {
+        'optimal_temperature': '25-40°C',
+        'optimal_humidity': '90-95%',
+        'optimal_rainfall': '40-250mm',
+        'ph_range': '6.5-7.0',
+        'season': 'Year-round',
+        'soil_type': 'Well-drained sandy loam soil'
+    },
+    'pigeonpeas': {
+        'optimal_temperature': '18-37°C',
+        'optimal_humidity': '30-70%',
+        'optimal_rainfall': '90-200mm',
+        'ph_range': '4.5-7.5',
+        'season': 'Kharif',
+        'soil_type': 'Well-drained loamy or sandy loam soil'
+    },
+    'pomegranate': {
+        'optimal_temperature': '18-25°C',
+        'optimal_humidity': '85-95%',
+        'optimal_rainfall': '100-115mm',
+        'ph_range': '5.5-7.2',
+        'season': 'Perennial',
+        'soil_type': 'Deep loamy or alluvial soil'
+    },
+    'rice': {
+        'optimal_temperature': '21-27°C',
+        'optimal_humidity': '80-100%',
+        'optimal_rainfall': '200-300mm',
+        'ph_range': '6.0-7.5',
+        'season': 'Monsoon',
+        'soil_type': 'Clayey soil, well-drained'
+    },
+    'watermelon': {
+        'optimal_temperature': '24-27°C',
+        'optimal_humidity': '80-90%',
+        'optimal_rainfall': '40-60mm',
+        'ph_range': '6.0-7.0',
+        'season': 'Zaid (summer)',
+        'soil_type': 'Sandy loam, well-drained'
+    }
+}
+
+def load_metadata(path=METADATA_PATH):
+    """Read the training metadata, or return None if it is not available"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print(f"[WARNING] Model metadata not found: {path}")
+        return None
+
+def class_names(model, label_encoder):
+    """Crop name for each predict_proba column, in column order"""
+    return [str(name) for name in label_encoder.inverse_transform(model.classes_)]
+
+def build_catalog(model, label_encoder, feature_names, metadata_path=METADATA_PATH):
+    """
+    Build the class-indexed crop catalog and validate it against the metadata
+
+    Returns {'names': [...], 'infos': [...], 'crop_info': {...}} where
+    names[i] and infos[i] describe predict_proba column i, and crop_info
+    maps each name to its information for /api/crops.
+    Raises ValueError if the encoder and the metadata disagree on the
+    crops or the features.
+    """
+    names = class_names(model, label_encoder)
+
+    metadata = load_metadata(metadata_path)
+    if metadata is not None:
+        if sorted(metadata.get('crops', [])) != sorted(names):
+            raise ValueError(
+                'Label encoder does not match model metadata: '
+                f"encoder has {sorted(names)}, metadata has {sorted(metadata.get('crops', []))}"
+            )
+        expected = [f.lower() for f in feature_names]
+        if [f.lower() for f in metadata.get('features', expected)] != expected:
+            raise ValueError(
+                f"Model metadata features {metadata['features']} do not match {list(feature_names)}"
+            )
+
+    missing = [name for name in names if name not in CROP_INFO]
+    if missing:
+        print(f"[WARNING] No crop information for: {', '.join(missing)}")
+
+    infos = [CROP_INFO.get(name, UNKNOWN_CROP_INFO) for name in names]
+    print(f"[OK] Crop catalog built for {len(names)} crops")
+    return {
+        'names': names,
+        'infos': infos,
+        'crop_info': dict(zip(names, infos))
+    }
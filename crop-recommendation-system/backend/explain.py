@@ -0,0 +1,262 @@
+"""
+Crop Recommendation System - Recommendation Explanations
+Per-feature contributions to the Random Forest's class probabilities,
+computed by following each input's decision path through every tree.
+
+Every step from a parent node to its child changes the tree's class
+distribution; that change is credited to the feature the parent splits
+on. Averaged over the forest, the bias (the training class distribution
+at the roots) plus the contributions of the seven features adds up
+exactly to predict_proba.
+
+All trees are flattened once into shared node arrays, so a whole batch of
+inputs walks every tree at the same time with vectorized NumPy steps.
+Single-input explanations are cached by input values.
+
+Benchmark:
+    python explain.py --bench
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import recommender
+import schema
+
+# Explanations kept in the LRU cache
+EXPLAIN_CACHE_SIZE = int(os.environ.get('EXPLAIN_CACHE_SIZE', 4096))
+# Target latency for one uncached explanation, reported with every response
+EXPLAIN_LATENCY_BUDGET_MS = float(os.environ.get('EXPLAIN_LATENCY_BUDGET_MS', 25))
+# Number of classes explained per input (best first)
+EXPLAIN_TOP_CLASSES = 3
+
+_forest = None
+_forest_lock = threading.Lock()
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _flatten_forest(model):
+    """
+    Concatenate the nodes of every tree into flat arrays
+
+    Child indices are rewritten to global node ids (leaves point to
+    themselves), and each node carries the change in class distribution
+    from its parent plus the feature the parent split on.
+    """
+    features, thresholds, lefts, rights, deltas, parent_features, roots = [], [], [], [], [], [], []
+    root_values = []
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n_nodes = tree.node_count
+        value = tree.value[:, 0, :].astype(np.float64)
+        value /= value.sum(axis=1, keepdims=True)
+
+        left = tree.children_left.astype(np.int64)
+        right = tree.children_right.astype(np.int64)
+        is_leaf = left == -1
+        local = np.arange(n_nodes)
+
+        # Parent of every node (the root keeps -1)
+        parent = np.full(n_nodes, -1, dtype=np.int64)
+        parent[left[~is_leaf]] = local[~is_leaf]
+        parent[right[~is_leaf]] = local[~is_leaf]
+
+        delta = np.zeros_like(value)
+        has_parent = parent >= 0
+        delta[has_parent] = value[has_parent] - value[parent[has_parent]]
+        parent_feature = np.zeros(n_nodes, dtype=np.int64)
+        parent_feature[has_parent] = tree.feature[parent[has_parent]]
+
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(tree.threshold)
+        lefts.append(np.where(is_leaf, local, left) + offset)
+        rights.append(np.where(is_leaf, local, right) + offset)
+        deltas.append(delta)
+        parent_features.append(parent_feature)
+        roots.append(offset)
+        root_values.append(value[0])
+        offset += n_nodes
+
+    lefts = np.concatenate(lefts)
+    return {
+        'feature': np.concatenate(features).astype(np.intp),
+        # sklearn compares float32 inputs against float64 thresholds
+        'threshold': np.concatenate(thresholds),
+        'left': lefts,
+        'right': np.concatenate(rights),
+        'is_leaf': lefts == np.arange(len(lefts)),
+        'delta': np.concatenate(deltas),
+        'parent_feature': np.concatenate(parent_features).astype(np.intp),
+        'roots': np.array(roots, dtype=np.intp),
+        'bias': np.mean(root_values, axis=0),
+        'n_trees': len(roots),
+        'max_depth': max(e.tree_.max_depth for e in model.estimators_)
+    }
+
+def prepare():
+    """Flatten the loaded forest (done once; call at startup to keep it off the request path)"""
+    global _forest
+    if _forest is None or _forest['model'] is not recommender.model:
+        with _forest_lock:
+            if _forest is None or _forest['model'] is not recommender.model:
+                forest = _flatten_forest(recommender.model)
+                forest['model'] = recommender.model
+                _forest = forest
+    return _forest
+
+def contributions(scaled):
+    """
+    Feature contributions for an (n, 7) scaled input matrix
+
+    Returns (bias, contrib) where bias is (n_classes,) and contrib is
+    (n, n_features, n_classes); bias + contrib.sum(axis=1) equals
+    predict_proba for each row.
+    """
+    forest = prepare()
+    X = np.asarray(scaled, dtype=np.float32)
+    n, n_features = X.shape
+    n_classes = forest['bias'].shape[0]
+
+    # One walker per (sample, tree), all advanced together one level at a time
+    rows = np.repeat(np.arange(n), forest['n_trees'])
+    nodes = np.tile(forest['roots'], n)
+    contrib = np.zeros((n * n_features, n_classes))
+
+    for _ in range(forest['max_depth']):
+        # Walkers that reached a leaf are done; drop them
+        active = ~forest['is_leaf'][nodes]
+        if not active.any():
+            break
+        nodes, rows = nodes[active], rows[active]
+
+        go_left = X[rows, forest['feature'][nodes]] <= forest['threshold'][nodes]
+        nodes = np.where(go_left, forest['left'][nodes], forest['right'][nodes])
+        np.add.at(contrib, rows * n_features + forest['parent_feature'][nodes], forest['delta'][nodes])
+
+    contrib = contrib.reshape(n, n_features, n_classes) / forest['n_trees']
+    return forest['bias'], contrib
+
+def _explanation(values, bias, contrib, probabilities):
+    """Build the explanation for one input from its contributions"""
+    # Ties go to the lowest class index, as with argmax in /api/recommend;
+    # rounding keeps summation noise in the contributions from breaking them
+    top = np.argsort(-np.round(probabilities, 12), kind='stable')[:EXPLAIN_TOP_CLASSES]
+    return {
+        'input': dict(zip(recommender.REQUIRED_FIELDS, values)),
+        'recommendation': recommender.crop_names[top[0]],
+        'confidence': float(probabilities[top[0]]),
+        'explanations': [
+            {
+                'crop': recommender.crop_names[idx],
+                'probability': float(probabilities[idx]),
+                'bias': float(bias[idx]),
+                'contributions': dict(zip(recommender.REQUIRED_FIELDS, contrib[:, idx].tolist()))
+            }
+            for idx in top
+        ]
+    }
+
+def explain_matrix(matrix):
+    """Explain every row of a validated (n, 7) feature matrix in one vectorized pass"""
+    bias, contrib = contributions(recommender.scaler.transform(matrix))
+    probabilities = bias + contrib.sum(axis=1)
+    return [
+        _explanation(matrix[row].tolist(), bias, contrib[row], probabilities[row])
+        for row in range(len(matrix))
+    ]
+
+def explain_one(values):
+    """
+    Explain one validated input, serving repeated inputs from the cache
+
+    Returns the explanation plus 'cached', 'elapsed_ms' and
+    'within_budget' (against EXPLAIN_LATENCY_BUDGET_MS).
+    """
+    started = time.perf_counter()
+    key = tuple(values)
+    with _cache_lock:
+        explanation = _cache.get(key)
+        if explanation is not None:
+            _cache.move_to_end(key)
+    cached = explanation is not None
+
+    if not cached:
+        explanation = explain_matrix(np.array([values], dtype=float))[0]
+        with _cache_lock:
+            _cache[key] = explanation
+            while len(_cache) > EXPLAIN_CACHE_SIZE:
+                _cache.popitem(last=False)
+
+    elapsed_ms = (time.perf_counter() - started) * 1000.0
+    return {
+        **explanation,
+        'cached': cached,
+        'elapsed_ms': elapsed_ms,
+        'within_budget': elapsed_ms <= EXPLAIN_LATENCY_BUDGET_MS
+    }
+
+def explain_batch(records):
+    """
+    Validate and explain a list of payload dicts
+
+    Returns one result per record, in order, in the same shape as
+    recommender.recommend_batch.
+    """
+    matrix, valid, errors = schema.validate_records(records)
+    explained = iter(explain_matrix(matrix[valid]) if valid.any() else ())
+    return [
+        {'index': row, 'success': True, 'data': next(explained)} if valid[row]
+        else {'index': row, 'success': False, 'error': errors[row]}
+        for row in range(len(records))
+    ]
+
+def benchmark(n_single=200, batch_size=256, seed=0):
+    """Time uncached single, cached single and batch explanations on random valid inputs"""
+    rng = np.random.default_rng(seed)
+    inputs = rng.uniform(schema.LOWER_BOUNDS, schema.UPPER_BOUNDS, size=(n_single, len(schema.FEATURE_NAMES)))
+    prepare()
+
+    def timed(func):
+        started = time.perf_counter()
+        func()
+        return (time.perf_counter() - started) * 1000.0
+
+    uncached = np.array([timed(lambda row=row: explain_one(row.tolist())) for row in inputs])
+    cached = np.array([timed(lambda row=row: explain_one(row.tolist())) for row in inputs])
+    batch_ms = timed(lambda: explain_matrix(inputs[:batch_size]))
+
+    # Sanity check: contributions must add up to predict_proba
+    bias, contrib = contributions(recommender.scaler.transform(inputs[:batch_size]))
+    expected = recommender.predict_proba_matrix(inputs[:batch_size])
+    max_error = float(np.abs(bias + contrib.sum(axis=1) - expected).max())
+
+    return {
+        'budget_ms': EXPLAIN_LATENCY_BUDGET_MS,
+        'uncached_p50_ms': float(np.percentile(uncached, 50)),
+        'uncached_p95_ms': float(np.percentile(uncached, 95)),
+        'cached_p50_ms': float(np.percentile(cached, 50)),
+        'batch_rows': min(batch_size, n_single),
+        'batch_ms': batch_ms,
+        'batch_per_row_ms': batch_ms / min(batch_size, n_single),
+        'within_budget': float(np.percentile(uncached, 95)) <= EXPLAIN_LATENCY_BUDGET_MS,
+        'max_additivity_error': max_error
+    }
+
+if __name__ == '__main__':
+    import sys
+
+    if '--bench' not in sys.argv:
+        print(__doc__)
+        sys.exit(0)
+    if not recommender.startup():
+        print("[ERROR] Models not loaded")
+        sys.exit(1)
+    report = benchmark()
+    for name, value in report.items():
+        print(f"{name:>22}: {value:.4f}" if isinstance(value, float) else f"{name:>22}: {value}")
+    sys.exit(0 if report['within_budget'] else 1)
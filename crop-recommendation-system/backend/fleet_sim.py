@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Crop Irrigation System - IoT Fleet Simulator and Replay Harness
+Generates sensor traffic for thousands of virtual Raspberry Pi devices and
+replays it against the backend, so sensor-path changes can be measured in
+CI without real hardware.
+
+Each virtual device posts the same payload as send_data_to_backend() in
+iot/crop_irrigation_rpi.py (plus its device_id), with:
+  - DHT temperature/humidity following a daily cycle plus sensor noise
+  - soil moisture drying with heat and jumping back up after rain
+  - rain spells that come and go per device
+  - send-time jitter within each reading interval
+  - outages: devices go offline for a while and send nothing
+
+Traces can be recorded to JSONL and replayed at any speed-up, either
+in-process (Flask test client, no network) or over HTTP.
+
+Usage:
+    python fleet_sim.py record trace.jsonl --devices 2000 --duration 3600
+    python fleet_sim.py replay trace.jsonl --speedup 60 --target http://localhost:5000
+    python fleet_sim.py run --devices 1000 --duration 600 --speedup 0
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+SENSOR_PATH = '/api/sensor-data'
+
+# Signal model
+BASE_TEMPERATURE = 27.0         # °C, daily mean
+TEMPERATURE_SWING = 6.0         # °C, daily amplitude (peak mid-afternoon)
+DRY_RAIN_VALUE = 900.0          # Rain sensor reading when dry (0-1023)
+WET_RAIN_VALUE = 250.0          # Rain sensor reading when raining
+RAIN_START_PROBABILITY = 0.002  # Per device per reading
+RAIN_STOP_PROBABILITY = 0.1
+OUTAGE_START_PROBABILITY = 0.001
+OUTAGE_STOP_PROBABILITY = 0.05
+
+def generate_trace(n_devices=1000, duration=3600, interval=60, jitter=0.5, seed=0,
+                   start=None, outage_probability=OUTAGE_START_PROBABILITY):
+    """
+    Simulate n_devices reporting every interval seconds for duration seconds
+
+    jitter: fraction of the interval by which each send is randomly delayed
+    Returns (events, stats) where events is a list of (offset_seconds,
+    payload) sorted by offset and stats counts readings lost to outages.
+    """
+    rng = np.random.default_rng(seed)
+    start = start or datetime(2026, 6, 1, 6, 0, 0)
+    device_ids = np.array([f'sim-{i:05d}' for i in range(n_devices)])
+
+    # Per-device characteristics
+    temperature_offset = rng.normal(0, 2, n_devices)
+    drying_rate = rng.uniform(2, 8, n_devices)
+    moisture = rng.uniform(350, 800, n_devices)
+    raining = np.zeros(n_devices, dtype=bool)
+    offline = np.zeros(n_devices, dtype=bool)
+
+    events = []
+    suppressed = 0
+    for tick in range(int(duration // interval)):
+        offset = tick * interval
+        hour = (start.hour + start.minute / 60 + offset / 3600) % 24
+
+        # Weather and outages evolve per device
+        raining = np.where(raining, rng.random(n_devices) > RAIN_STOP_PROBABILITY,
+                           rng.random(n_devices) < RAIN_START_PROBABILITY)
+        offline = np.where(offline, rng.random(n_devices) > OUTAGE_STOP_PROBABILITY,
+                           rng.random(n_devices) < outage_probability)
+
+        daily = np.sin(2 * np.pi * (hour - 9) / 24)
+        temperature = BASE_TEMPERATURE + temperature_offset + TEMPERATURE_SWING * daily + rng.normal(0, 0.5, n_devices)
+        humidity = np.clip(65 - 2.5 * (temperature - BASE_TEMPERATURE) + 25 * raining + rng.normal(0, 3, n_devices), 14, 100)
+        moisture = np.clip(
+            moisture - drying_rate * (1 + np.maximum(temperature - 25, 0) / 10) + 40 * raining + rng.normal(0, 4, n_devices),
+            0, 1023
+        )
+        rain_value = np.where(raining, WET_RAIN_VALUE, DRY_RAIN_VALUE) + rng.normal(0, 20, n_devices)
+
+        online = np.flatnonzero(~offline)
+        suppressed += n_devices - len(online)
+        send_at = offset + rng.uniform(0, jitter * interval, len(online))
+        for i, at in zip(online, send_at):
+            events.append((float(at), {
+                'timestamp': (start + timedelta(seconds=float(at))).isoformat(),
+                'device_id': str(device_ids[i]),
+                'soil_moisture': round(float(moisture[i]), 1),
+                'temperature': round(float(temperature[i]), 1),
+                'humidity': round(float(humidity[i]), 1),
+                'rain_value': round(float(rain_value[i]), 1)
+            }))
+
+    events.sort(key=lambda event: event[0])
+    return events, {'devices': n_devices, 'readings': len(events), 'offline_readings': suppressed}
+
+def save_trace(events, path):
+    """Write a trace as JSONL: one {"at": seconds, "payload": {...}} per line"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for at, payload in events:
+            f.write(json.dumps({'at': at, 'payload': payload}) + '\n')
+
+def load_trace(path):
+    """Read a JSONL trace written by save_trace (or recorded from real devices)"""
+    events = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            event = json.loads(line)
+            events.append((float(event['at']), event['payload']))
+    return events
+
+class InProcessTarget:
+    """Sends payloads through the Flask test client (no network)"""
+
+    def __init__(self):
+        import recommender
+        from app import app
+        # Load up front so the first replayed request does not pay for it
+        recommender.startup()
+        self.client = app.test_client()
+
+    def post(self, payload):
+        response = self.client.post(SENSOR_PATH, json=payload)
+        return response.status_code, response.get_json(silent=True)
+
+class HttpTarget:
+    """Sends payloads to a running backend over HTTP (one session per thread)"""
+
+    def __init__(self, base_url, timeout=10):
+        import requests
+        self.requests = requests
+        self.url = base_url.rstrip('/') + SENSOR_PATH
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def post(self, payload):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self.requests.Session()
+        response = session.post(self.url, json=payload, timeout=self.timeout)
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        return response.status_code, body
+
+def replay(events, target, speedup=1.0, concurrency=32):
+    """
+    Replay a trace against a target
+
+    speedup: trace seconds per wall second (0 = send as fast as possible)
+    End-to-end latency is measured from each event's scheduled send time to
+    its response, so it includes any queueing when the backend falls behind.
+    With speedup 0 there is no schedule, and latency is per request.
+    """
+    latencies = []
+    failures = []
+    pump_on = [0]
+    lock = threading.Lock()
+
+    def send(scheduled, payload):
+        if scheduled is None:
+            scheduled = time.perf_counter()
+        try:
+            status, body = target.post(payload)
+            ok = status == 200 and bool(body and body.get('success'))
+        except Exception as e:
+            status, body, ok = repr(e), None, False
+        done = time.perf_counter()
+        with lock:
+            if ok:
+                latencies.append(done - scheduled)
+                if (body.get('pump_command') or {}).get('pump') == 'on':
+                    pump_on[0] += 1
+            else:
+                failures.append(status)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for at, payload in events:
+            scheduled = started + (at / speedup if speedup > 0 else 0.0)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, scheduled if speedup > 0 else None, payload)
+    elapsed = time.perf_counter() - started
+
+    sent = len(events)
+    lat_ms = np.array(latencies) * 1000.0 if latencies else np.zeros(1)
+    failure_kinds = {}
+    for status in failures:
+        failure_kinds[str(status)] = failure_kinds.get(str(status), 0) + 1
+    return {
+        'sent': sent,
+        'ok': len(latencies),
+        'dropped': len(failures),
+        'drop_rate': len(failures) / sent if sent else 0.0,
+        'failures': failure_kinds,
+        'elapsed_seconds': elapsed,
+        'ingest_per_second': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'latency_ms': {
+            'p50': float(np.percentile(lat_ms, 50)),
+            'p95': float(np.percentile(lat_ms, 95)),
+            'p99': float(np.percentile(lat_ms, 99)),
+            'max': float(lat_ms.max())
+        },
+        'pump_on_commands': pump_on[0]
+    }
+
+def make_target(spec):
+    """'inprocess' or a base URL such as http://localhost:5000"""
+    return InProcessTarget() if spec == 'inprocess' else HttpTarget(spec)
+
+def print_report(report, trace_stats=None):
+    if trace_stats:
+        print(f"[INFO] Trace: {trace_stats['devices']:,} devices, {trace_stats['readings']:,} readings, "
+              f"{trace_stats['offline_readings']:,} lost to simulated outages")
+    print(f"[OK] Sent {report['sent']:,} readings in {report['elapsed_seconds']:.2f}s: "
+          f"{report['ingest_per_second']:,.0f} ingests/sec")
+    print(f"[INFO] Dropped {report['dropped']:,} ({report['drop_rate']:.2%}) {report['failures'] or ''}")
+    lat = report['latency_ms']
+    print(f"[INFO] End-to-end latency ms: p50 {lat['p50']:.2f}  p95 {lat['p95']:.2f}  "
+          f"p99 {lat['p99']:.2f}  max {lat['max']:.2f}")
+    print(f"[INFO] Pump-on commands returned: {report['pump_on_commands']:,}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate and replay IoT sensor traffic against the backend')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def add_fleet_args(p):
+        p.add_argument('--devices', type=int, default=1000, help='virtual devices (default: 1000)')
+        p.add_argument('--duration', type=float, default=3600, help='simulated seconds (default: 3600)')
+        p.add_argument('--interval', type=float, default=60, help='seconds between readings per device (default: 60)')
+        p.add_argument('--jitter', type=float, default=0.5, help='send jitter as a fraction of the interval (default: 0.5)')
+        p.add_argument('--outage-rate', type=float, default=OUTAGE_START_PROBABILITY,
+                       help='per-reading probability a device goes offline')
+        p.add_argument('--seed', type=int, default=0)
+
+    def add_replay_args(p):
+        p.add_argument('--target', default='inprocess', help="'inprocess' or backend base URL (default: inprocess)")
+        p.add_argument('--speedup', type=float, default=0, help='trace seconds per wall second; 0 = as fast as possible')
+        p.add_argument('--concurrency', type=int, default=32, help='concurrent senders (default: 32)')
+        p.add_argument('--verbose', action='store_true', help='keep the backend request log when running in-process')
+
+    record = sub.add_parser('record', help='generate a trace and save it as JSONL')
+    record.add_argument('trace')
+    add_fleet_args(record)
+
+    replay_cmd = sub.add_parser('replay', help='replay a saved trace')
+    replay_cmd.add_argument('trace')
+    add_replay_args(replay_cmd)
+
+    run = sub.add_parser('run', help='generate a trace and replay it immediately')
+    add_fleet_args(run)
+    add_replay_args(run)
+
+    args = parser.parse_args(argv)
+
+    if args.command in ('record', 'run'):
+        events, stats = generate_trace(args.devices, args.duration, args.interval, args.jitter,
+                                       args.seed, outage_probability=args.outage_rate)
+        if args.command == 'record':
+            save_trace(events, args.trace)
+            print(f"[OK] Recorded {stats['readings']:,} readings from {stats['devices']:,} devices -> {args.trace}")
+            return 0
+    else:
+        events, stats = load_trace(args.trace), None
+
+    target = make_target(args.target)
+    # The in-process backend logs every request; discard that instead of
+    # mixing it into (or buffering it for) the report
+    quiet = args.target == 'inprocess' and not args.verbose
+    with open(os.devnull, 'w') if quiet else contextlib.nullcontext() as devnull:
+        with contextlib.redirect_stdout(devnull) if quiet else contextlib.nullcontext():
+            report = replay(events, target, args.speedup, args.concurrency)
+    print_report(report, stats)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+Gunicorn configuration for the Crop Recommendation API
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every setting can be overridden through environment variables so the same
+file works on a laptop and in a container.
+"""
+
+import multiprocessing
+import os
+
+# Binding
+bind = os.environ.get('BIND', f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', '5000')}")
+
+# Workers: inference is CPU-bound, so one worker per core (plus one to cover
+# the occasional I/O wait) keeps every core busy without oversubscribing.
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() + 1))
+worker_class = 'sync'
+# More than one thread per worker switches gunicorn to the gthread worker,
+# which lets concurrent requests in one worker share a micro-batch
+# (see BATCH_MAX_WAIT_MS in recommender.py).
+threads = int(os.environ.get('THREADS', 1))
+
+# Load the app (and the models) in the master before forking, so all
+# workers share a single copy-on-write copy of the forest.
+preload_app = True
+
+# Graceful restarts: SIGHUP / SIGTERM give in-flight requests this long to
+# finish, and recycling workers after a bounded number of requests guards
+# against slow memory growth. The jitter spreads restarts out so workers
+# are never all recycled at once.
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+timeout = int(os.environ.get('WORKER_TIMEOUT', 60))
+max_requests = int(os.environ.get('MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.environ.get('MAX_REQUESTS_JITTER', 500))
+keepalive = 5
+
+# Logging
+accesslog = os.environ.get('ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    """Called in the master once the app is preloaded and warmed up"""
+    server.log.info(f"[OK] Crop Recommendation API ready with {workers} workers on {bind}")
+
+    # The irrigation scheduler needs every reading of a device in one
+    # long-lived process, which workers (split traffic, recycled) are not:
+    # fork the ingest service now so every worker inherits its address
+    import irrigation
+    if not irrigation.start_service():
+        server.log.warning("[WARNING] Irrigation scheduler disabled (IRRIGATION_SCHEDULER=off); "
+                           "devices use their local rule")
+
+    import recommender
+    profile = recommender.get_startup_profile()
+    server.log.info(f"[INFO] Startup took {profile['total_ms']:.0f} ms: {profile['phases_ms']}")
+
+
+def post_fork(server, worker):
+    """Called in each worker right after fork"""
+    server.log.info(f"[INFO] Worker {worker.pid} started (sharing preloaded models)")
+
+
+def on_exit(server):
+    """Called in the master just before it exits"""
+    import irrigation
+    irrigation.stop_service()
+
+
+def post_worker_init(worker):
+    """Called in each worker after gunicorn set up its signal handlers"""
+    import profiling
+    profiling.install_signal_handler()
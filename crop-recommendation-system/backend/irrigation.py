@@ -0,0 +1,544 @@
+"""
+Crop Irrigation System - Server-side Irrigation Scheduler
+Evaluates the irrigation rule from iot/crop_irrigation_rpi.py for every
+device as its readings arrive, extended with rolling-window features:
+
+    water = soil is dry
+            and it is not raining now and has not rained in the window
+            and (hot, dry air  or  soil moisture falling fast)
+
+Fleet state lives in NumPy arrays indexed by device slot (one ring buffer
+row per device), so ingesting a batch of readings and re-evaluating the
+rule are vectorized over devices rather than per-device Python loops.
+Concurrent sensor-ingest requests are coalesced into one such batch by an
+InferenceBatcher (see batching.py).
+
+Device windows must see every reading of a device, so they live in one
+long-lived process. The ASGI server and `python app.py` keep them in the
+serving process. Under gunicorn, whose workers split the traffic and are
+recycled, the master forks a dedicated ingest service (start_service) that
+owns the scheduler, and workers send it each reading over a local socket.
+IRRIGATION_SCHEDULER=off disables server-side scheduling altogether
+(pump_command is then null and devices use their local rule).
+
+Benchmark:
+    python irrigation.py --bench
+"""
+
+import os
+import secrets
+import shutil
+import signal
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from batching import RESULT_TIMEOUT, InferenceBatcher, InferenceTimeout
+
+# Thresholds (same meaning as in iot/crop_irrigation_rpi.py)
+SOIL_MOISTURE_THRESHOLD = 500   # Below this value, soil is dry (0-1023)
+TEMPERATURE_THRESHOLD = 30.0    # Above this temperature, check humidity
+HUMIDITY_THRESHOLD = 60.0       # Below this humidity, consider watering
+RAIN_THRESHOLD = 500            # Below this value, it's raining (0-1023)
+
+# Rolling window
+WINDOW_SIZE = int(os.environ.get('IRRIGATION_WINDOW', 12))   # readings kept per device
+DRYING_SLOPE = 5.0              # Moisture drop per reading that counts as drying fast
+MIN_TREND_READINGS = 3          # Readings needed before the trend is used
+
+PUMP_DURATION = 5               # Seconds the pump runs per watering command
+
+INITIAL_CAPACITY = 1024
+# Devices tracked at once; beyond this the least recently seen device is evicted
+MAX_DEVICES = int(os.environ.get('IRRIGATION_MAX_DEVICES', 50000))
+# Coalescing of concurrent ingests: the batch collector waits up to this long
+# for more readings (0 = only take readings that queued up meanwhile)
+INGEST_BATCH_WAIT_MS = float(os.environ.get('IRRIGATION_BATCH_WAIT_MS', 0))
+INGEST_BATCH_SIZE = int(os.environ.get('IRRIGATION_BATCH_SIZE', 256))
+# 'off' disables server-side scheduling (see module docstring)
+SCHEDULER_ENABLED = os.environ.get('IRRIGATION_SCHEDULER', 'on').lower() != 'off'
+
+class IrrigationScheduler:
+    """Per-device rolling windows and vectorized irrigation decisions for a fleet"""
+
+    def __init__(self, window=WINDOW_SIZE, capacity=INITIAL_CAPACITY, max_devices=MAX_DEVICES):
+        self.window = window
+        self.max_devices = max(1, int(max_devices))
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._device_ids = []
+        self._clock = 0
+        self.evictions = 0
+        self._allocate(min(capacity, self.max_devices))
+
+        # Age (in readings) of ring-buffer column j is (pos - 1 - j) % window
+        self._columns = np.arange(window)
+
+    def _allocate(self, capacity):
+        """Create (or grow) the per-device arrays to hold capacity devices"""
+        old = getattr(self, '_capacity', 0)
+        shapes = {
+            'moisture': ((capacity, self.window), np.nan, float),
+            'rain': ((capacity, self.window), np.nan, float),
+            'temperature': ((capacity,), np.nan, float),
+            'humidity': ((capacity,), np.nan, float),
+            'count': ((capacity,), 0, np.int64),
+            'pos': ((capacity,), 0, np.int64),
+            'last_seen': ((capacity,), 0, np.int64),
+        }
+        for name, (shape, fill, dtype) in shapes.items():
+            array = np.full(shape, fill, dtype=dtype)
+            if hasattr(self, name):
+                array[:old] = getattr(self, name)
+            setattr(self, name, array)
+        self._capacity = capacity
+
+    def _slot_ids(self, device_ids):
+        """Slot index for each device id, registering unseen devices (evicting the stalest when full)"""
+        self._clock += 1
+        slots = np.empty(len(device_ids), dtype=np.int64)
+        for i, device_id in enumerate(device_ids):
+            slot = self._slots.get(device_id)
+            if slot is None:
+                if len(self._device_ids) < self.max_devices:
+                    slot = len(self._device_ids)
+                    self._device_ids.append(device_id)
+                    if slot >= self._capacity:
+                        self._allocate(min(self._capacity * 2, self.max_devices))
+                else:
+                    slot = self._evict()
+                    self._device_ids[slot] = device_id
+                self._slots[device_id] = slot
+            # Mark as seen now, so a later new device in this batch cannot evict it
+            self.last_seen[slot] = self._clock
+            slots[i] = slot
+        return slots
+
+    def _evict(self):
+        """Free the slot of the least recently seen device and return it"""
+        slot = int(np.argmin(self.last_seen[:len(self._device_ids)]))
+        if self.last_seen[slot] == self._clock:
+            raise ValueError(f'More than {self.max_devices} distinct devices in one batch')
+        del self._slots[self._device_ids[slot]]
+        self.moisture[slot] = np.nan
+        self.rain[slot] = np.nan
+        self.temperature[slot] = np.nan
+        self.humidity[slot] = np.nan
+        self.count[slot] = 0
+        self.pos[slot] = 0
+        self.evictions += 1
+        return slot
+
+    def _write(self, slots, moisture, temperature, humidity, rain):
+        """Append one reading per slot (slots must be unique)"""
+        pos = self.pos[slots]
+        self.moisture[slots, pos] = moisture
+        self.rain[slots, pos] = rain
+        self.temperature[slots] = temperature
+        self.humidity[slots] = humidity
+        self.pos[slots] = (pos + 1) % self.window
+        self.count[slots] = np.minimum(self.count[slots] + 1, self.window)
+
+    def ingest_many(self, device_ids, moisture, temperature, humidity, rain):
+        """
+        Record one reading per entry and re-evaluate the affected devices
+
+        All arguments are equal-length sequences. A device may appear more
+        than once; its readings are applied in order.
+        Returns the decisions for the affected devices, one entry per
+        distinct device in slot order (see _evaluate and pump_command);
+        'entries' gives each input entry's position in that order.
+        """
+        moisture = np.asarray(moisture, dtype=float)
+        temperature = np.asarray(temperature, dtype=float)
+        humidity = np.asarray(humidity, dtype=float)
+        rain = np.asarray(rain, dtype=float)
+
+        with self._lock:
+            slots = self._slot_ids(device_ids)
+
+            affected = np.unique(slots)
+            if len(affected) == len(slots):
+                self._write(slots, moisture, temperature, humidity, rain)
+            else:
+                # Fancy-index writes need unique slots: apply repeats in rounds
+                remaining = np.arange(len(slots))
+                while len(remaining):
+                    _, first = np.unique(slots[remaining], return_index=True)
+                    batch = remaining[np.sort(first)]
+                    self._write(slots[batch], moisture[batch], temperature[batch], humidity[batch], rain[batch])
+                    remaining = np.setdiff1d(remaining, batch, assume_unique=True)
+
+            decision = self._evaluate(affected)
+            decision['entries'] = np.searchsorted(affected, slots)
+            return decision
+
+    def ingest_readings(self, readings):
+        """
+        Record a list of (device_id, reading) pairs with one ingest_many call
+
+        Returns one pump command per pair; repeated devices all get the
+        decision after their last reading.
+        """
+        decision = self.ingest_many(
+            [device_id for device_id, _ in readings],
+            [reading['soil_moisture'] for _, reading in readings],
+            [reading['temperature'] for _, reading in readings],
+            [reading['humidity'] for _, reading in readings],
+            [reading.get('rain_value', np.nan) for _, reading in readings]
+        )
+        return [pump_command(decision, i) for i in decision['entries']]
+
+    def ingest(self, device_id, reading):
+        """
+        Record one sensor-ingest payload and return the pump command for it
+
+        reading: dict with soil_moisture, temperature, humidity and rain_value
+        """
+        decision = self.ingest_many(
+            [device_id],
+            [reading['soil_moisture']],
+            [reading['temperature']],
+            [reading['humidity']],
+            [reading.get('rain_value', np.nan)]
+        )
+        return pump_command(decision, 0)
+
+    def _evaluate(self, slots):
+        """Vectorized rule evaluation for the given slots (caller holds the lock)"""
+        count = self.count[slots]
+        pos = self.pos[slots]
+        moisture_window = self.moisture[slots]
+        rain_window = self.rain[slots]
+
+        # Age of every ring-buffer column: 0 = latest reading
+        age = (pos[:, None] - 1 - self._columns[None, :]) % self.window
+        filled = age < count[:, None]
+        latest = np.take_along_axis(moisture_window, ((pos - 1) % self.window)[:, None], axis=1)[:, 0]
+        rain_now = np.take_along_axis(rain_window, ((pos - 1) % self.window)[:, None], axis=1)[:, 0]
+
+        # Least-squares moisture slope per reading over the filled window
+        x = np.where(filled, -age, 0).astype(float)
+        y = np.where(filled, moisture_window, 0.0)
+        k = np.maximum(count, 1)
+        x_mean = x.sum(axis=1) / k
+        y_mean = y.sum(axis=1) / k
+        dx = np.where(filled, x - x_mean[:, None], 0.0)
+        var = (dx * dx).sum(axis=1)
+        trend = np.where(var > 0, (dx * (y - y_mean[:, None])).sum(axis=1) / np.where(var > 0, var, 1), 0.0)
+
+        # The device only waters when rain_value > RAIN_THRESHOLD, so exactly
+        # RAIN_THRESHOLD counts as rain; a missing rain sensor (NaN) does not
+        recent_rain = (filled & (rain_window <= RAIN_THRESHOLD)).any(axis=1)
+        raining = rain_now <= RAIN_THRESHOLD
+
+        temperature = self.temperature[slots]
+        humidity = self.humidity[slots]
+        dry = latest < SOIL_MOISTURE_THRESHOLD
+        heat_stress = (temperature > TEMPERATURE_THRESHOLD) & (humidity < HUMIDITY_THRESHOLD)
+        drying = (count >= MIN_TREND_READINGS) & (trend < -DRYING_SLOPE)
+
+        water = dry & ~raining & ~recent_rain & (heat_stress | drying)
+
+        return {
+            'slots': slots,
+            'water': water,
+            'dry': dry,
+            'heat_stress': heat_stress,
+            'drying': drying,
+            'recent_rain': recent_rain | raining,
+            'moisture_trend': trend,
+            'readings': count
+        }
+
+    def evaluate_fleet(self):
+        """Evaluate the rule for every known device in one vectorized pass"""
+        with self._lock:
+            return self._evaluate(np.arange(len(self._device_ids)))
+
+    def device_id(self, slot):
+        return self._device_ids[slot]
+
+    def __len__(self):
+        return len(self._device_ids)
+
+def pump_command(decision, i):
+    """Pump command for entry i of an evaluate() result, as returned to the device"""
+    water = bool(decision['water'][i])
+    return {
+        'pump': 'on' if water else 'off',
+        'duration_seconds': PUMP_DURATION if water else 0,
+        'reasons': {
+            'dry_soil': bool(decision['dry'][i]),
+            'heat_stress': bool(decision['heat_stress'][i]),
+            'drying_fast': bool(decision['drying'][i]),
+            'recent_rain': bool(decision['recent_rain'][i])
+        },
+        'moisture_trend': float(decision['moisture_trend'][i]),
+        'window_readings': int(decision['readings'][i])
+    }
+
+# Shared scheduler used by the sensor-ingest endpoints (None when disabled),
+# fed through a batcher so concurrent requests share one ingest_many call
+scheduler = IrrigationScheduler() if SCHEDULER_ENABLED else None
+ingest_batcher = (
+    InferenceBatcher(scheduler.ingest_readings, max_batch=INGEST_BATCH_SIZE, max_wait_ms=INGEST_BATCH_WAIT_MS,
+                     stack_fn=list, name='ingest-batcher')
+    if scheduler is not None else None
+)
+
+# Dedicated ingest service (gunicorn): address and key are set in the master
+# by start_service() and inherited by the workers it forks afterwards
+_service_address = None
+_service_authkey = None
+_service_process = None
+_service_local = threading.local()
+_service_pool = None
+
+class ServiceUnavailable(RuntimeError):
+    """The dedicated ingest service could not be reached (served as a 503)"""
+
+def start_service():
+    """
+    Fork the process that owns the scheduler and serves every worker
+
+    Call in the gunicorn master before the workers are forked
+    (gunicorn.conf.py does so in when_ready); workers then send readings to
+    it instead of keeping their own, partial device windows.
+    Returns False when the scheduler is disabled.
+    """
+    global _service_address, _service_authkey, _service_process
+    if scheduler is None:
+        return False
+    if _service_process is not None:
+        return True
+    address = os.path.join(tempfile.mkdtemp(prefix='irrigation-'), 'ingest.sock')
+    authkey = secrets.token_bytes(32)
+    # A plain fork rather than multiprocessing.Process: workers inherit
+    # multiprocessing's child list, and its atexit hook in a recycled worker
+    # would terminate the service
+    ready_r, ready_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(ready_r)
+        try:
+            _serve(address, authkey, ready_w)
+        finally:
+            os._exit(1)
+    os.close(ready_w)
+    with os.fdopen(ready_r, 'rb') as ready:
+        started = ready.read(1) == b'1'
+    if not started:
+        raise RuntimeError('Irrigation service did not start')
+    _service_address, _service_authkey, _service_process = address, authkey, pid
+    print(f"[OK] Irrigation service started (pid {pid}) on {address}")
+    return True
+
+def stop_service():
+    """Stop the ingest service (gunicorn master on exit)"""
+    global _service_process
+    if _service_process is None:
+        return
+    try:
+        os.kill(_service_process, signal.SIGTERM)
+        os.waitpid(_service_process, 0)
+    except (ChildProcessError, ProcessLookupError):
+        # Already gone (or reaped by the gunicorn arbiter)
+        pass
+    shutil.rmtree(os.path.dirname(_service_address), ignore_errors=True)
+    _service_process = None
+
+def _serve(address, authkey, ready_fd):
+    """Ingest service main loop: one thread per worker connection, all feeding ingest_batcher"""
+    # Drop the handlers inherited from the gunicorn master so SIGTERM and
+    # Ctrl-C stop this process instead of signalling the arbiter; signals
+    # meant for the master or workers (e.g. SIGUSR2 sent to every child of
+    # the master to toggle profiling) must not kill it
+    for name in ('SIGTERM', 'SIGINT', 'SIGQUIT', 'SIGCHLD'):
+        signal.signal(getattr(signal, name), signal.SIG_DFL)
+    for name in ('SIGHUP', 'SIGUSR1', 'SIGUSR2', 'SIGTTIN', 'SIGTTOU', 'SIGWINCH'):
+        signal.signal(getattr(signal, name), signal.SIG_IGN)
+    listener = Listener(address, family='AF_UNIX', authkey=authkey)
+    os.write(ready_fd, b'1')
+    os.close(ready_fd)
+    while True:
+        try:
+            conn = listener.accept()
+        except OSError:
+            # Failed handshake (wrong key or a client that went away)
+            continue
+        threading.Thread(target=_handle, args=(conn,), name='irrigation-connection', daemon=True).start()
+
+def _handle(conn):
+    """Answer one worker's requests: ('ingest', device_id, reading) or ('metrics',)"""
+    with conn:
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                if message[0] == 'ingest':
+                    reply = (True, ingest_batcher.predict((message[1], message[2])))
+                else:
+                    reply = (True, _local_metrics())
+            except Exception as e:
+                reply = (False, f'{type(e).__name__}: {e}')
+            try:
+                conn.send(reply)
+            except (EOFError, OSError):
+                return
+
+def _service_call(message):
+    """Send one request to the ingest service and wait for its reply"""
+    # One connection per thread (gthread workers) and per process (a
+    # connection must not be shared across a fork)
+    conn = getattr(_service_local, 'conn', None)
+    if conn is None or _service_local.pid != os.getpid():
+        try:
+            conn = Client(_service_address, family='AF_UNIX', authkey=_service_authkey)
+        except OSError as e:
+            raise ServiceUnavailable(f'Irrigation service unavailable: {e}') from None
+        _service_local.conn, _service_local.pid = conn, os.getpid()
+    try:
+        conn.send(message)
+        if not conn.poll(RESULT_TIMEOUT):
+            # The late reply would be read by the next call: start over
+            raise InferenceTimeout(RESULT_TIMEOUT)
+        ok, value = conn.recv()
+    except (EOFError, OSError, InferenceTimeout) as e:
+        _service_local.conn = None
+        conn.close()
+        if isinstance(e, InferenceTimeout):
+            raise
+        raise ServiceUnavailable('Irrigation service unavailable: connection lost') from None
+    if not ok:
+        raise RuntimeError(value)
+    return value
+
+def submit_reading(device_id, reading):
+    """Queue one sensor-ingest payload; the Future resolves to its pump command (None when off)"""
+    global _service_pool
+    if _service_address is not None:
+        if _service_pool is None:
+            _service_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='irrigation-client')
+        return _service_pool.submit(_service_call, ('ingest', device_id, reading))
+    if ingest_batcher is None:
+        future = Future()
+        future.set_result(None)
+        return future
+    return ingest_batcher.submit((device_id, reading))
+
+def ingest_reading(device_id, reading):
+    """Pump command for one sensor-ingest payload, or None when the scheduler is off"""
+    if _service_address is not None:
+        return _service_call(('ingest', device_id, reading))
+    if ingest_batcher is None:
+        return None
+    return ingest_batcher.predict((device_id, reading))
+
+def _local_metrics():
+    if ingest_batcher is None:
+        return {'enabled': False}
+    return {**ingest_batcher.metrics(), 'devices': len(scheduler), 'evictions': scheduler.evictions}
+
+def get_ingest_metrics():
+    """Ingest coalescing metrics reported by /api/metrics (from the ingest service under gunicorn)"""
+    if _service_address is not None:
+        try:
+            return {**_service_call(('metrics',)), 'service_pid': _service_process}
+        except (ServiceUnavailable, InferenceTimeout) as e:
+            return {'enabled': True, 'error': str(e)}
+    return _local_metrics()
+
+def benchmark(n_devices=10000, ticks=50, seed=0, clients=32):
+    """
+    Simulate n_devices virtual devices each reporting once per tick
+
+    Compares fleet-batched ingestion (one ingest_many call per tick) with
+    per-reading ingestion and with clients concurrent senders coalesced by
+    the ingest batcher (as the endpoints run), and times a full fleet
+    evaluation.
+    """
+    rng = np.random.default_rng(seed)
+    device_ids = [f'device-{i:05d}' for i in range(n_devices)]
+    moisture = rng.uniform(300, 800, n_devices)
+    drying_rate = rng.uniform(0, 15, n_devices)
+
+    fleet = IrrigationScheduler()
+    watered = 0
+    started = time.perf_counter()
+    for _ in range(ticks):
+        moisture = np.clip(moisture - drying_rate + rng.normal(0, 3, n_devices), 0, 1023)
+        decision = fleet.ingest_many(
+            device_ids,
+            moisture,
+            rng.normal(30, 4, n_devices),
+            rng.uniform(30, 90, n_devices),
+            np.where(rng.random(n_devices) < 0.02, 200.0, 900.0)
+        )
+        watered += int(decision['water'].sum())
+        # Devices that were told to water get wetter
+        moisture[decision['slots'][decision['water']]] += 150
+    batched = time.perf_counter() - started
+
+    single = IrrigationScheduler()
+    sample = min(n_devices, 2000)
+    started = time.perf_counter()
+    for i in range(sample):
+        single.ingest(device_ids[i], {
+            'soil_moisture': float(moisture[i]),
+            'temperature': 31.0,
+            'humidity': 50.0,
+            'rain_value': 900.0
+        })
+    per_reading = (time.perf_counter() - started) / sample
+
+    coalesced = IrrigationScheduler()
+    batcher = InferenceBatcher(coalesced.ingest_readings, max_batch=INGEST_BATCH_SIZE, max_wait_ms=0,
+                               stack_fn=list, name='ingest-batcher-bench')
+    reading = {'soil_moisture': 450.0, 'temperature': 31.0, 'humidity': 50.0, 'rain_value': 900.0}
+
+    def send(client):
+        for i in range(client, sample, clients):
+            batcher.predict((device_ids[i], reading))
+
+    threads = [threading.Thread(target=send, args=(c,)) for c in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    coalesced_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    fleet.evaluate_fleet()
+    fleet_eval = time.perf_counter() - started
+
+    readings = n_devices * ticks
+    return {
+        'devices': n_devices,
+        'ticks': ticks,
+        'readings': readings,
+        'batched_readings_per_second': readings / batched,
+        'single_readings_per_second': 1.0 / per_reading,
+        'single_ingest_us': per_reading * 1e6,
+        'coalesced_readings_per_second': sample / coalesced_time,
+        'coalesced_mean_batch': batcher.metrics()['mean_batch_size'],
+        'fleet_evaluation_ms': fleet_eval * 1000.0,
+        'pump_on_commands': watered
+    }
+
+if __name__ == '__main__':
+    import sys
+
+    if '--bench' not in sys.argv:
+        print(__doc__)
+        sys.exit(0)
+    report = benchmark()
+    for name, value in report.items():
+        print(f"{name:>30}: {value:,.2f}" if isinstance(value, float) else f"{name:>30}: {value:,}")
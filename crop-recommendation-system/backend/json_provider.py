@@ -0,0 +1,94 @@
+"""
+Crop Recommendation System - Fast JSON Encoding
+JSON provider for the Flask app (and encoder for the ASGI app) that uses
+orjson when it is installed and falls back to the standard library.
+
+Both paths serialize NumPy scalars and arrays directly: orjson natively,
+the stdlib fallback through a default hook.
+"""
+
+import json
+from datetime import date, datetime
+
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+def _default(o):
+    """Encode the types json/orjson do not handle natively"""
+    if isinstance(o, np.generic):
+        return o.item()
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(obj, sort_keys=False):
+        """Serialize obj to UTF-8 JSON bytes"""
+        option = _ORJSON_OPTIONS | orjson.OPT_SORT_KEYS if sort_keys else _ORJSON_OPTIONS
+        return orjson.dumps(obj, default=_default, option=option)
+
+    loads = orjson.loads
+else:
+    def dumps_bytes(obj, sort_keys=False):
+        """Serialize obj to UTF-8 JSON bytes"""
+        return json.dumps(
+            obj, default=_default, sort_keys=sort_keys,
+            ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8')
+
+    loads = json.loads
+
+def wants_ndjson(accept, stream=None):
+    """
+    Whether a batch response should be streamed as NDJSON
+
+    accept: the Accept header value; NDJSON must be its best match (so a
+            low-q "application/x-ndjson;q=0.1" next to JSON does not count)
+    stream: the ?stream= query parameter ("ndjson" forces streaming)
+    Shared by app.py and asgi_app.py so both servers negotiate alike.
+    """
+    if stream == 'ndjson':
+        return True
+    return parse_accept_header(accept or '', MIMEAccept).best == NDJSON_MIMETYPE
+
+def dumps_ndjson_line(obj):
+    """Serialize obj as one newline-terminated NDJSON record"""
+    return dumps_bytes(obj) + b'\n'
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson (stdlib fallback) with NumPy support"""
+
+    def dumps(self, obj, **kwargs):
+        if kwargs.keys() - {'sort_keys'}:
+            # Callers asking for json.dumps-specific options get the stdlib encoder
+            kwargs.setdefault('default', _default)
+            return json.dumps(obj, **kwargs)
+        return dumps_bytes(obj, sort_keys=kwargs.get('sort_keys', self.sort_keys)).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        """Build the response body as bytes without an intermediate str"""
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            dumps_bytes(obj, sort_keys=self.sort_keys) + b'\n',
+            mimetype=self.mimetype
+        )
@@ -0,0 +1,312 @@
+"""
+Crop Recommendation System - On-demand Profiling
+Opt-in profiling of a running server, switched on and off at runtime
+through the admin endpoint (/api/admin/profiling) or a signal, without a
+redeploy:
+
+  - a sampling profiler thread that records every thread's stack at a
+    fixed interval
+  - cProfile capture of a sampled fraction of requests to the profiled
+    endpoints (the recommend hot path)
+  - allocation tracking with tracemalloc snapshots
+
+Output goes to PROFILE_DIR:
+  samples-<pid>-<time>.folded   collapsed stacks ("frame;frame;... count"),
+                                for flamegraph.pl, speedscope or inferno
+  alloc-<pid>-<time>.folded     allocated bytes by stack, same format
+  alloc-<pid>-<time>.snapshot   tracemalloc snapshot (tracemalloc.Snapshot.load)
+  request-<endpoint>-<pid>-<time>.prof
+                                cProfile stats (pstats, snakeviz, flameprof)
+
+When profiling is off nothing is installed: the profiled view functions
+are the original ones, no thread runs and tracemalloc is not tracing.
+"""
+
+import cProfile
+import hmac
+import os
+import random
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from functools import wraps
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+# Admin endpoint is disabled (404) unless a token is configured
+PROFILE_ADMIN_TOKEN = os.environ.get('PROFILE_ADMIN_TOKEN', '')
+# Signal that toggles profiling in the receiving process (empty to disable)
+PROFILE_SIGNAL = os.environ.get('PROFILE_SIGNAL', 'SIGUSR2')
+
+DEFAULT_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', 10))
+DEFAULT_REQUEST_RATE = float(os.environ.get('PROFILE_REQUEST_RATE', 0.01))
+TRACEMALLOC_FRAMES = int(os.environ.get('PROFILE_TRACEMALLOC_FRAMES', 25))
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    """Background thread that counts collapsed stacks of all other threads"""
+
+    def __init__(self, interval_ms=DEFAULT_SAMPLE_INTERVAL_MS):
+        self.interval = max(1.0, float(interval_ms)) / 1000.0
+        self.stacks = Counter()
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        """Copy of the stack counts so far"""
+        with self._lock:
+            return dict(self.stacks)
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f'thread-{ident}'))
+                with self._lock:
+                    self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+class Profiler:
+    """Runtime switch for the sampling profiler, request cProfile and tracemalloc"""
+
+    def __init__(self, output_dir=PROFILE_DIR):
+        self.output_dir = output_dir
+        self._lock = threading.Lock()
+        # Only one request is profiled at a time (cProfile is per thread,
+        # and overlapping captures would distort each other)
+        self._request_slot = threading.Lock()
+        self._views = []
+        self._installed = {}
+        self._sampler = None
+        self._tracing = False
+        self._request_rate = 0.0
+        self._started = None
+        self._requests_profiled = 0
+
+    @property
+    def enabled(self):
+        return self._started is not None
+
+    def attach(self, view_functions, endpoints):
+        """
+        Register Flask view functions whose requests can be profiled
+
+        view_functions: app.view_functions; the wrappers are only swapped in
+        while profiling is on, so the request path is untouched otherwise.
+        """
+        self._views.append((view_functions, list(endpoints)))
+
+    def _output_path(self, kind, ext):
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        return os.path.join(self.output_dir, f'{kind}-{os.getpid()}-{stamp}.{ext}')
+
+    def start(self, sample_interval_ms=None, request_rate=None, trace_allocations=False):
+        """Turn profiling on (no-op if already on); returns the status"""
+        with self._lock:
+            if self.enabled:
+                return self.status()
+            interval = DEFAULT_SAMPLE_INTERVAL_MS if sample_interval_ms is None else float(sample_interval_ms)
+            self._request_rate = DEFAULT_REQUEST_RATE if request_rate is None else float(request_rate)
+            self._requests_profiled = 0
+
+            if interval > 0:
+                self._sampler = SamplingProfiler(interval)
+                self._sampler.start()
+            if trace_allocations and not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self._tracing = True
+            if self._request_rate > 0:
+                for view_functions, endpoints in self._views:
+                    for endpoint in endpoints:
+                        original = view_functions[endpoint]
+                        self._installed[(id(view_functions), endpoint)] = (view_functions, original)
+                        view_functions[endpoint] = self._profiled(endpoint, original)
+
+            self._started = time.time()
+            print(f"[INFO] Profiling started (sample interval {interval} ms, request rate "
+                  f"{self._request_rate}, tracemalloc {'on' if self._tracing else 'off'})")
+            return self.status()
+
+    def stop(self):
+        """Turn profiling off and write the collected profiles; returns the files written"""
+        with self._lock:
+            if not self.enabled:
+                return []
+            for (_, endpoint), (view_functions, original) in self._installed.items():
+                view_functions[endpoint] = original
+            self._installed = {}
+
+            files = self._write_snapshot()
+            if self._sampler is not None:
+                self._sampler.stop()
+                files += self._write_samples()
+                self._sampler = None
+            if self._tracing:
+                tracemalloc.stop()
+                self._tracing = False
+            self._started = None
+            print(f"[OK] Profiling stopped, wrote {len(files)} file(s) to {self.output_dir}")
+            return files
+
+    def snapshot(self):
+        """Write the stacks sampled so far and an allocation snapshot without stopping"""
+        with self._lock:
+            if not self.enabled:
+                return []
+            files = self._write_snapshot()
+            if self._sampler is not None:
+                files += self._write_samples()
+            return files
+
+    def toggle(self):
+        return self.stop() if self.enabled else self.start()
+
+    def status(self):
+        return {
+            'enabled': self.enabled,
+            'running_seconds': time.time() - self._started if self.enabled else 0.0,
+            'sampler': self._sampler is not None,
+            'samples': self._sampler.samples if self._sampler is not None else 0,
+            'request_rate': self._request_rate if self.enabled else 0.0,
+            'requests_profiled': self._requests_profiled,
+            'tracemalloc': self._tracing,
+            'output_dir': os.path.abspath(self.output_dir),
+            'pid': os.getpid()
+        }
+
+    def _write_samples(self):
+        """Write the sampler's collapsed stacks (caller holds the lock)"""
+        stacks = self._sampler.collapsed()
+        if not stacks:
+            return []
+        path = self._output_path('samples', 'folded')
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in stacks.items():
+                f.write(f'{stack} {count}\n')
+        return [path]
+
+    def _write_snapshot(self):
+        """Dump a tracemalloc snapshot plus allocated bytes by stack (caller holds the lock)"""
+        if not self._tracing:
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+        path = self._output_path('alloc', 'snapshot')
+        snapshot.dump(path)
+
+        folded = path[:-len('snapshot')] + 'folded'
+        with open(folded, 'w', encoding='utf-8') as f:
+            for stat in snapshot.statistics('traceback'):
+                # Traceback frames are most recent last
+                stack = ';'.join(
+                    f"{os.path.basename(frame.filename)}:{frame.lineno}" for frame in stat.traceback
+                )
+                f.write(f'{stack} {stat.size}\n')
+        return [path, folded]
+
+    def _profiled(self, endpoint, view):
+        """Wrap a view so a sampled fraction of its calls run under cProfile"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if random.random() >= self._request_rate or not self._request_slot.acquire(blocking=False):
+                return view(*args, **kwargs)
+            try:
+                profile = cProfile.Profile()
+                try:
+                    return profile.runcall(view, *args, **kwargs)
+                finally:
+                    profile.dump_stats(self._output_path(f'request-{endpoint}', 'prof'))
+                    self._requests_profiled += 1
+            finally:
+                self._request_slot.release()
+        return wrapper
+
+# Shared profiler for the API process
+profiler = Profiler()
+
+def run_admin_action(data):
+    """
+    Apply an admin endpoint request to the shared profiler
+
+    Returns (result, error): result is the profiler status plus the files
+    written, error the message to return with a 400 response.
+    """
+    data = data if isinstance(data, dict) else {}
+    action = data.get('action')
+    files = []
+    try:
+        if action == 'start':
+            request_rate = data.get('request_rate')
+            if request_rate is not None and not 0 <= float(request_rate) <= 1:
+                return None, 'request_rate must be between 0-1'
+            profiler.start(
+                sample_interval_ms=data.get('sample_interval_ms'),
+                request_rate=request_rate,
+                trace_allocations=bool(data.get('tracemalloc', False))
+            )
+        elif action == 'stop':
+            files = profiler.stop()
+        elif action == 'snapshot':
+            files = profiler.snapshot()
+        else:
+            return None, 'action must be one of: start, stop, snapshot'
+    except (TypeError, ValueError):
+        return None, 'sample_interval_ms and request_rate must be numbers'
+    return {**profiler.status(), 'files': files}, None
+
+def check_admin_token(token):
+    """
+    Check an X-Admin-Token header value
+
+    Returns the HTTP status to reject the request with (404 while no
+    PROFILE_ADMIN_TOKEN is configured, 403 on a wrong token) or None.
+    """
+    if not PROFILE_ADMIN_TOKEN:
+        return 404
+    if not hmac.compare_digest((token or '').encode(), PROFILE_ADMIN_TOKEN.encode()):
+        return 403
+    return None
+
+def install_signal_handler():
+    """
+    Toggle profiling when this process receives PROFILE_SIGNAL
+
+    Must be called from the main thread; under gunicorn it is installed in
+    each worker (post_worker_init), so signal a worker pid, not the master.
+    """
+    signum = getattr(signal, PROFILE_SIGNAL, None) if PROFILE_SIGNAL else None
+    if signum is None or threading.current_thread() is not threading.main_thread():
+        return False
+
+    def handle(signum, frame):
+        # Writing files from a signal handler can deadlock on held locks
+        threading.Thread(target=profiler.toggle, name='profiling-toggle', daemon=True).start()
+
+    signal.signal(signum, handle)
+    return True
@@ -0,0 +1,265 @@
+"""
+Crop Recommendation System - Shared Inference Core
+Model loading, input validation and prediction shared by the Flask API
+(app.py) and the ASGI API (asgi_app.py)
+
+Importing this module is cheap: the pickled artifacts (and scikit-learn,
+which unpickling pulls in) are only loaded by startup(), which servers
+call as an explicit, timed phase before accepting traffic.
+"""
+
+import os
+import pickle
+import threading
+import time
+import numpy as np
+from datetime import datetime
+
+import schema
+from crop_catalog import CROP_INFO, build_catalog
+from batching import InferenceBatcher
+
+# Model paths
+MODEL_PATH = 'crop_recommendation_model.pkl'
+SCALER_PATH = 'feature_scaler.pkl'
+ENCODER_PATH = 'label_encoder.pkl'
+
+# Set by load_models()
+model = scaler = label_encoder = None
+_load_lock = threading.Lock()
+_startup_lock = threading.Lock()
+_startup_attempted = False
+
+# Startup profile: milliseconds spent in each startup phase, reported by
+# /api/startup (import = importing the server module, load = unpickling the
+# artifacts, catalog = building the crop catalog, warmup = first inference)
+startup_profile = {}
+
+def record_startup_phase(name, seconds):
+    """Record how long a startup phase took"""
+    startup_profile[name] = round(seconds * 1000.0, 2)
+    print(f"[INFO] Startup phase '{name}' took {seconds * 1000.0:.1f} ms")
+
+# Readiness flag: set only after a warmup inference has gone through the
+# full scale -> predict path, so /api/health does not report ready while
+# the first real request would still pay one-off initialisation costs.
+model_ready = False
+
+# Representative sample (rice-growing conditions) used for warmup inference
+WARMUP_SAMPLE = [[90, 40, 40, 21.5, 82, 6.5, 202]]
+
+def warmup_models():
+    """Run one inference end-to-end and mark the API as ready"""
+    global model_ready
+    if not models_loaded():
+        print("[WARNING] Skipping warmup: models not loaded")
+        return False
+    started = time.perf_counter()
+    scaled_input = scaler.transform(np.array(WARMUP_SAMPLE, dtype=float))
+    model.predict_proba(scaled_input)
+    label_encoder.inverse_transform(model.predict(scaled_input))
+    model_ready = True
+    record_startup_phase('warmup', time.perf_counter() - started)
+    print("[OK] Warmup inference completed")
+    return True
+
+# Micro-batching: with BATCH_MAX_WAIT_MS > 0, concurrent recommend calls are
+# queued for up to that long (or until BATCH_MAX_SIZE rows) and scored with
+# a single scaler.transform / predict_proba call.
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 0))
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 32))
+
+# Feature order expected by the scaler and the model
+REQUIRED_FIELDS = list(schema.FEATURE_NAMES)
+
+# Largest number of rows accepted by one batch recommendation request; a
+# streamed (NDJSON) response is scored in STREAM_CHUNK_ROWS chunks, so it
+# can accept a larger MAX_STREAM_ROWS
+MAX_BATCH_ROWS = int(os.environ.get('MAX_BATCH_ROWS', 1000))
+MAX_STREAM_ROWS = int(os.environ.get('MAX_STREAM_ROWS', 100000))
+STREAM_CHUNK_ROWS = int(os.environ.get('STREAM_CHUNK_ROWS', 512))
+
+# Crop catalog indexed by predict_proba column: crop_names[i] / crop_infos[i]
+# (placeholder from CROP_INFO until load_models() builds it from the model)
+catalog = {'names': list(CROP_INFO), 'infos': list(CROP_INFO.values()), 'crop_info': CROP_INFO}
+crop_names = catalog['names']
+crop_infos = catalog['infos']
+
+def models_loaded():
+    """Return True when the model, scaler and label encoder are all available"""
+    return model is not None and scaler is not None and label_encoder is not None
+
+def load_models():
+    """Unpickle the model, scaler and label encoder and build the crop catalog"""
+    global model, scaler, label_encoder, catalog, crop_names, crop_infos
+    with _load_lock:
+        if models_loaded():
+            return True
+
+        started = time.perf_counter()
+        try:
+            with open(MODEL_PATH, 'rb') as f:
+                loaded_model = pickle.load(f)
+            with open(SCALER_PATH, 'rb') as f:
+                loaded_scaler = pickle.load(f)
+            with open(ENCODER_PATH, 'rb') as f:
+                loaded_encoder = pickle.load(f)
+        except FileNotFoundError as e:
+            print(f"[WARNING] Model file not found: {e}")
+            return False
+        record_startup_phase('load', time.perf_counter() - started)
+        print("[OK] Models loaded successfully")
+
+        started = time.perf_counter()
+        catalog = build_catalog(loaded_model, loaded_encoder, REQUIRED_FIELDS)
+        crop_names = catalog['names']
+        crop_infos = catalog['infos']
+        record_startup_phase('catalog', time.perf_counter() - started)
+
+        model, scaler, label_encoder = loaded_model, loaded_scaler, loaded_encoder
+        return True
+
+def startup():
+    """
+    Startup phase for servers: load the artifacts, then run warmup inference
+
+    Returns True when the API is ready to serve recommendations.
+    """
+    global _startup_attempted
+    _startup_attempted = True
+    load_models()
+    return warmup_models()
+
+def ensure_started():
+    """
+    Lazy fallback for hosts that never call startup() (flask run,
+    gunicorn app:app, app.test_client()): run it once, on first use
+
+    Returns True when the API is ready to serve recommendations.
+    """
+    if model_ready or _startup_attempted:
+        return model_ready
+    with _startup_lock:
+        if not model_ready and not _startup_attempted:
+            print("[WARNING] startup() was not called by the server entry point; loading models on first request")
+            startup()
+    return model_ready
+
+def validate_recommend_input(data):
+    """
+    Validate a recommendation request payload
+
+    Returns (values, error) where values is the list of the seven features
+    as floats in REQUIRED_FIELDS order, or error is the message to return
+    with a 400 response.
+    """
+    return schema.validate_one(data)
+
+def predict_proba_matrix(input_data):
+    """Scale an (n, 7) feature matrix and return the (n, n_classes) class probabilities"""
+    return model.predict_proba(scaler.transform(input_data))
+
+batcher = (
+    InferenceBatcher(predict_proba_matrix, max_batch=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS)
+    if BATCH_MAX_WAIT_MS > 0 else None
+)
+
+def predict_probabilities(values):
+    """Class probabilities for one validated input, coalesced with concurrent calls when batching is on"""
+    if batcher is not None:
+        return batcher.predict(values)
+    return predict_proba_matrix(np.array([values]))[0]
+
+def build_recommendation(values, probabilities):
+    """
+    Build the response data for one input from its class probabilities
+
+    values: the seven features in REQUIRED_FIELDS order (list or array row)
+    """
+    # Decode prediction (the forest predicts the most probable class)
+    best = int(np.argmax(probabilities))
+    recommended_crop = crop_names[best]
+    confidence = float(probabilities[best])
+
+    # Get top 3 recommendations
+    top_indices = np.argsort(probabilities)[-3:][::-1]
+    top_recommendations = [
+        [crop_names[idx], float(probabilities[idx])]
+        for idx in top_indices
+    ]
+
+    return {
+        'input': dict(zip(REQUIRED_FIELDS, values)),
+        'recommendation': recommended_crop,
+        'confidence': confidence,
+        'top_recommendations': top_recommendations,
+        'crop_info': {
+            recommended_crop: crop_infos[best]
+        },
+        'timestamp': datetime.now().isoformat()
+    }
+
+def recommend_crop(values):
+    """
+    Run the model on one validated input and build the response data
+
+    values: list of the seven features in REQUIRED_FIELDS order
+    """
+    return build_recommendation(values, predict_probabilities(values))
+
+def iter_recommend_batch(records, chunk_size=None):
+    """
+    Validate and score a list of payload dicts, one predict_proba call per chunk
+
+    Yields one result per record, in order: {'index', 'success', 'data'}
+    for valid rows and {'index', 'success', 'error'} for rejected ones.
+    Scoring chunk by chunk keeps memory bounded for streamed responses.
+    """
+    chunk_size = chunk_size or len(records) or 1
+    for start in range(0, len(records), chunk_size):
+        matrix, valid, errors = schema.validate_records(records[start:start + chunk_size])
+        scored = iter(predict_proba_matrix(matrix[valid]) if valid.any() else ())
+        for row in range(len(matrix)):
+            if valid[row]:
+                yield {
+                    'index': start + row,
+                    'success': True,
+                    'data': build_recommendation(matrix[row], next(scored))
+                }
+            else:
+                yield {'index': start + row, 'success': False, 'error': errors[row]}
+
+def recommend_batch(records):
+    """Validate and score a list of payload dicts with one predict_proba call"""
+    return list(iter_recommend_batch(records))
+
+def get_batching_metrics():
+    """Micro-batching metrics reported by /api/metrics"""
+    if batcher is None:
+        return {'enabled': False}
+    return batcher.metrics()
+
+def get_crops():
+    """Crop names and information reported by /api/crops"""
+    return {
+        'crops': crop_names,
+        'crop_info': catalog['crop_info']
+    }
+
+def get_stats():
+    """Static model statistics reported by /api/stats"""
+    return {
+        'total_crops': len(crop_names),
+        'crops': crop_names,
+        'model_type': 'Random Forest Classifier',
+        'features': REQUIRED_FIELDS
+    }
+
+def get_startup_profile():
+    """Startup phase timings reported by /api/startup"""
+    return {
+        'phases_ms': dict(startup_profile),
+        'total_ms': round(sum(startup_profile.values()), 2),
+        'ready': model_ready,
+        'pid': os.getpid()
+    }
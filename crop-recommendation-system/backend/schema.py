@@ -0,0 +1,110 @@
+"""
+Crop Recommendation System - Input Schema
+Declarative definition of the seven model features, compiled once at
+import into the lookup tuples and NumPy bound arrays used to validate
+single requests and whole batches.
+"""
+
+import numpy as np
+
+# (field, label, min, max, unit) in the order expected by the scaler and model
+FEATURES = (
+    ('N', 'Nitrogen', 0, 140, ' ppm'),
+    ('P', 'Phosphorus', 5, 145, ' ppm'),
+    ('K', 'Potassium', 5, 205, ' ppm'),
+    ('temperature', 'Temperature', 8, 43, '°C'),
+    ('humidity', 'Humidity', 14, 100, '%'),
+    ('ph', 'pH', 3.5, 9.5, ''),
+    ('rainfall', 'Rainfall', 20, 300, 'mm'),
+)
+
+MISSING_FIELDS_ERROR = 'Missing required fields: ' + ', '.join(f[0] for f in FEATURES)
+INVALID_TYPE_ERROR = 'Invalid data types. All parameters must be numbers.'
+
+# Compiled views of FEATURES
+FEATURE_NAMES = tuple(f[0] for f in FEATURES)
+FEATURE_BOUNDS = tuple((float(f[2]), float(f[3])) for f in FEATURES)
+RANGE_MESSAGES = tuple(f"{f[1]} must be between {f[2]:g}-{f[3]:g}{f[4]}" for f in FEATURES)
+LOWER_BOUNDS = np.array([b[0] for b in FEATURE_BOUNDS])
+UPPER_BOUNDS = np.array([b[1] for b in FEATURE_BOUNDS])
+
+def range_error(failed):
+    """Build the range error message for the failing feature positions"""
+    return 'Validation errors: ' + '; '.join(RANGE_MESSAGES[i] for i in failed)
+
+def has_all_fields(data):
+    """True when data is a dict holding every feature"""
+    return isinstance(data, dict) and all(name in data for name in FEATURE_NAMES)
+
+def validate_one(data):
+    """
+    Validate one request payload
+
+    Returns (values, error) where values is the list of the seven features
+    as floats in FEATURE_NAMES order, or error is the message for a 400.
+    """
+    # All fields must be present before any is converted, so a payload that
+    # is both incomplete and malformed reports the missing fields
+    if not has_all_fields(data):
+        return None, MISSING_FIELDS_ERROR
+    try:
+        values = [float(data[name]) for name in FEATURE_NAMES]
+    except (TypeError, ValueError):
+        return None, INVALID_TYPE_ERROR
+
+    # Fast path: no allocation unless a bound is violated (NaN fails both comparisons)
+    for value, (low, high) in zip(values, FEATURE_BOUNDS):
+        if not low <= value <= high:
+            break
+    else:
+        return values, None
+
+    failed = [i for i, (value, (low, high)) in enumerate(zip(values, FEATURE_BOUNDS))
+              if not low <= value <= high]
+    return None, range_error(failed)
+
+def parse_batch(records):
+    """
+    Convert a list of payload dicts into an (n, 7) float matrix
+
+    Returns (matrix, errors) where errors maps row index -> message for
+    rows that are missing fields or hold non-numeric values; those rows are
+    left as NaN in the matrix.
+    """
+    matrix = np.full((len(records), len(FEATURE_NAMES)), np.nan)
+    errors = {}
+    for row, record in enumerate(records):
+        if not has_all_fields(record):
+            errors[row] = MISSING_FIELDS_ERROR
+            continue
+        try:
+            matrix[row] = [float(record[name]) for name in FEATURE_NAMES]
+        except (TypeError, ValueError):
+            errors[row] = INVALID_TYPE_ERROR
+    return matrix, errors
+
+def validate_batch(matrix, errors=None):
+    """
+    Range-check an (n, 7) feature matrix with vectorized bounds masks
+
+    errors: row index -> message from parse_batch; those rows stay invalid
+    Returns (valid, errors) where valid is a boolean mask over the rows and
+    errors maps every invalid row to its message.
+    """
+    errors = dict(errors or {})
+    in_range = (matrix >= LOWER_BOUNDS) & (matrix <= UPPER_BOUNDS)
+    valid = in_range.all(axis=1)
+
+    for row in np.flatnonzero(~valid):
+        row = int(row)
+        if row not in errors:
+            errors[row] = range_error(np.flatnonzero(~in_range[row]))
+    if errors:
+        valid[list(errors)] = False
+    return valid, errors
+
+def validate_records(records):
+    """Parse and range-check a list of payload dicts in one pass"""
+    matrix, errors = parse_batch(records)
+    valid, errors = validate_batch(matrix, errors)
+    return matrix, valid, errors
@@ -0,0 +1,124 @@
+"""
+Crop Recommendation System - What-if Sensitivity Sweeps
+Varies one or two input features over a range while holding the others at
+a base input, and returns how every crop's probability changes.
+
+The whole grid is built as one feature matrix and scored with a single
+predict_proba call, so a 50-step sweep costs one request and one model
+call instead of 50.
+"""
+
+import os
+
+import numpy as np
+
+import recommender
+import schema
+
+# Limits on the grid size of one sweep
+MAX_SWEEP_STEPS = int(os.environ.get('MAX_SWEEP_STEPS', 200))
+MAX_SWEEP_POINTS = int(os.environ.get('MAX_SWEEP_POINTS', 10000))
+DEFAULT_SWEEP_STEPS = 25
+# Crops whose probability never reaches this are left out of the curves
+DEFAULT_MIN_PROBABILITY = 0.05
+# Decimal places kept in the returned probabilities
+PROBABILITY_DECIMALS = 4
+
+def parse_sweep_request(data):
+    """
+    Validate a sweep request
+
+    Request body:
+    {
+        "base": {"N": ..., "P": ..., ...},               # same as /api/recommend
+        "axes": [{"feature": "rainfall", "start": 20, "stop": 300}],  # 1 or 2 axes
+        "steps": 25,                                      # points per axis
+        "min_probability": 0.05                           # optional
+    }
+    start/stop default to the feature's valid range.
+
+    Returns (spec, error) where spec holds the base values, the axes as
+    (feature index, values) pairs and min_probability.
+    """
+    if not isinstance(data, dict):
+        return None, 'Request body must be a JSON object with "base" and "axes"'
+
+    base, error = schema.validate_one(data.get('base'))
+    if error:
+        return None, error
+
+    axes = data.get('axes')
+    if isinstance(axes, dict):
+        axes = [axes]
+    if not isinstance(axes, list) or not 1 <= len(axes) <= 2:
+        return None, 'axes must list one or two features to vary'
+
+    try:
+        steps = int(data.get('steps', DEFAULT_SWEEP_STEPS))
+        min_probability = float(data.get('min_probability', DEFAULT_MIN_PROBABILITY))
+    except (TypeError, ValueError):
+        return None, 'steps and min_probability must be numbers'
+    if not 2 <= steps <= MAX_SWEEP_STEPS:
+        return None, f'steps must be between 2-{MAX_SWEEP_STEPS}'
+    if steps ** len(axes) > MAX_SWEEP_POINTS:
+        return None, f'Sweep grid too large: at most {MAX_SWEEP_POINTS} points'
+
+    parsed = []
+    for axis in axes:
+        feature = axis.get('feature') if isinstance(axis, dict) else None
+        if feature not in schema.FEATURE_NAMES:
+            return None, f"Unknown sweep feature: {feature}. Use one of: {', '.join(schema.FEATURE_NAMES)}"
+        column = schema.FEATURE_NAMES.index(feature)
+        if any(column == other for other, _ in parsed):
+            return None, f'Feature {feature} appears in more than one axis'
+
+        low, high = schema.FEATURE_BOUNDS[column]
+        try:
+            start = float(axis.get('start', low))
+            stop = float(axis.get('stop', high))
+        except (TypeError, ValueError):
+            return None, schema.INVALID_TYPE_ERROR
+        if not (low <= start <= high and low <= stop <= high):
+            return None, schema.range_error([column])
+        parsed.append((column, np.linspace(start, stop, steps)))
+
+    return {'base': base, 'axes': parsed, 'min_probability': min_probability}, None
+
+def build_grid(base, axes):
+    """Feature matrix with one row per grid point (first axis varies slowest)"""
+    grids = np.meshgrid(*[values for _, values in axes], indexing='ij')
+    matrix = np.tile(np.asarray(base, dtype=float), (grids[0].size, 1))
+    for (column, _), grid in zip(axes, grids):
+        matrix[:, column] = grid.ravel()
+    return matrix
+
+def run_sweep(spec):
+    """
+    Score the sweep grid with one predict_proba call
+
+    curves maps each crop that reaches min_probability somewhere on the
+    grid to its probabilities, shaped like the grid ([steps] for one axis,
+    [steps, steps] for two); recommendations holds the top crop per point.
+    """
+    axes = spec['axes']
+    shape = [len(values) for _, values in axes]
+    probabilities = recommender.predict_proba_matrix(build_grid(spec['base'], axes))
+
+    kept = np.flatnonzero(probabilities.max(axis=0) >= spec['min_probability'])
+    rounded = np.round(probabilities, PROBABILITY_DECIMALS)
+    best = probabilities.argmax(axis=1)
+
+    return {
+        'base': dict(zip(recommender.REQUIRED_FIELDS, spec['base'])),
+        'axes': [
+            {'feature': schema.FEATURE_NAMES[column], 'values': np.round(values, 4)}
+            for column, values in axes
+        ],
+        'shape': shape,
+        'crops': [recommender.crop_names[idx] for idx in kept],
+        'curves': {
+            recommender.crop_names[idx]: np.ascontiguousarray(rounded[:, idx]).reshape(shape)
+            for idx in kept
+        },
+        'recommendations': np.array(recommender.crop_names, dtype=object)[best].reshape(shape).tolist()
+    }
@@ -5,6 +5,7 @@ Run this script to test all API endpoints
 
 import requests
 import json
+import numpy as np
 from pprint import pprint
 import time
 
@@ -153,6 +154,8 @@ def test_valid_recommendations():
     failed = 0
     
     for test_name, test_data in test_cases.items():
+        # Pop from a copy; later tests reuse test_cases
+        test_data = test_data.copy()
         expected_crop = test_data.pop("expected_crop")
         
         try:
@@ -242,6 +245,212 @@ def test_invalid_inputs():
     print_info(f"\nResults: {passed} passed, {failed} failed")
     return failed == 0
 
+# Error messages of the original /api/recommend validation, which the
+# single and batch endpoints must keep returning word for word
+validation_message_cases = {
+    "Missing Fields": (
+        {"N": 90, "P": 40},
+        "Missing required fields: N, P, K, temperature, humidity, ph, rainfall"
+    ),
+    "Missing Fields And Invalid Type": (
+        {"N": "not_a_number", "P": 40},
+        "Missing required fields: N, P, K, temperature, humidity, ph, rainfall"
+    ),
+    "Invalid Data Type": (
+        {"N": "not_a_number", "P": 40, "K": 40, "temperature": 21.5,
+         "humidity": 82, "ph": 6.5, "rainfall": 202},
+        "Invalid data types. All parameters must be numbers."
+    ),
+    "Out of Range - Several Fields": (
+        {"N": 200, "P": 40, "K": 40, "temperature": 0,
+         "humidity": 82, "ph": 10, "rainfall": 202},
+        "Validation errors: Nitrogen must be between 0-140 ppm; "
+        "Temperature must be between 8-43°C; pH must be between 3.5-9.5"
+    ),
+    "Out of Range - Every Field": (
+        {"N": -1, "P": 1, "K": 1, "temperature": 50,
+         "humidity": 5, "ph": 1, "rainfall": 500},
+        "Validation errors: Nitrogen must be between 0-140 ppm; "
+        "Phosphorus must be between 5-145 ppm; Potassium must be between 5-205 ppm; "
+        "Temperature must be between 8-43°C; Humidity must be between 14-100%; "
+        "pH must be between 3.5-9.5; Rainfall must be between 20-300mm"
+    )
+}
+
+def test_validation_messages():
+    """Test that single and batch validation return the original error messages"""
+    print_header("Testing Validation Message Parity")
+    
+    passed = 0
+    failed = 0
+    
+    try:
+        response = requests.post(
+            f"{API_BASE_URL}/recommend/batch",
+            json={"inputs": [payload for payload, _ in validation_message_cases.values()]},
+            timeout=10
+        )
+        batch_results = response.json()['data']['results']
+    except Exception as e:
+        print_error(f"Batch request failed: {e}")
+        return False
+    
+    for (test_name, (payload, expected)), batch_result in zip(
+            validation_message_cases.items(), batch_results):
+        try:
+            response = requests.post(
+                f"{API_BASE_URL}/recommend",
+                json=payload,
+                timeout=10
+            )
+            single_error = response.json().get('error')
+            batch_error = batch_result.get('error')
+            
+            if response.status_code == 400 and single_error == expected and batch_error == expected:
+                print_success(f"{test_name}: Same message for single and batch")
+                passed += 1
+            else:
+                print_error(f"{test_name}: Expected '{expected}'")
+                print_info(f"Single (HTTP {response.status_code}): '{single_error}'")
+                print_info(f"Batch: '{batch_error}'")
+                failed += 1
+                
+        except Exception as e:
+            print_error(f"{test_name}: Exception - {e}")
+            failed += 1
+    
+    print_info(f"\nResults: {passed} passed, {failed} failed")
+    return failed == 0
+
+def test_explain_additivity():
+    """Test that explanation contributions add up to the model probabilities"""
+    print_header("Testing Explanation Additivity")
+    
+    passed = 0
+    failed = 0
+    tolerance = 1e-6
+    
+    for test_name, test_data in test_cases.items():
+        payload = {k: v for k, v in test_data.items() if k != "expected_crop"}
+        
+        try:
+            explained = requests.post(
+                f"{API_BASE_URL}/recommend/explain",
+                json=payload,
+                timeout=10
+            ).json()['data']
+            batch = requests.post(
+                f"{API_BASE_URL}/recommend/explain/batch",
+                json={"inputs": [payload]},
+                timeout=10
+            ).json()['data']['results'][0]['data']
+            recommended = requests.post(
+                f"{API_BASE_URL}/recommend",
+                json=payload,
+                timeout=10
+            ).json()['data']
+            
+            # bias + sum(contributions) must reproduce each class probability
+            worst = max(
+                abs(e['bias'] + sum(e['contributions'].values()) - e['probability'])
+                for e in explained['explanations'] + batch['explanations']
+            )
+            same_top = (
+                explained['recommendation'] == batch['recommendation']
+                and explained['recommendation'].lower() == recommended['recommendation'].lower()
+                and abs(explained['confidence'] - recommended['confidence']) <= tolerance
+            )
+            
+            if worst <= tolerance and same_top:
+                print_success(f"{test_name}: Contributions add up (max error {worst:.1e})")
+                passed += 1
+            else:
+                print_error(
+                    f"{test_name}: Max error {worst:.1e}, explained "
+                    f"'{explained['recommendation']}' ({explained['confidence']:.4f}), "
+                    f"recommended '{recommended['recommendation']}' ({recommended['confidence']:.4f})"
+                )
+                failed += 1
+                
+        except Exception as e:
+            print_error(f"{test_name}: Exception - {e}")
+            failed += 1
+    
+    print_info(f"\nResults: {passed} passed, {failed} failed")
+    return failed == 0
+
+def test_sweep():
+    """Test one- and two-axis what-if sweeps against /api/recommend"""
+    print_header("Testing Sensitivity Sweep Endpoint")
+    
+    base = {k: v for k, v in test_cases["Rice Growing Conditions"].items() if k != "expected_crop"}
+    # Integer grid values, so the axis values echoed back are exact
+    sweeps = {
+        "One axis (rainfall)": [{"feature": "rainfall", "start": 20, "stop": 260}],
+        "Two axes (temperature x humidity)": [
+            {"feature": "temperature", "start": 10, "stop": 40},
+            {"feature": "humidity", "start": 20, "stop": 80}
+        ]
+    }
+    steps = 7
+    
+    passed = 0
+    failed = 0
+    
+    for test_name, axes in sweeps.items():
+        try:
+            response = requests.post(
+                f"{API_BASE_URL}/recommend/sweep",
+                json={"base": base, "axes": axes, "steps": steps},
+                timeout=10
+            )
+            data = response.json()['data']
+            shape = [steps] * len(axes)
+            
+            def dims(nested):
+                return [len(nested)] + dims(nested[0]) if isinstance(nested, list) else []
+            
+            shapes_ok = (
+                data['shape'] == shape
+                and dims(data['recommendations']) == shape
+                and all(dims(curve) == shape for curve in data['curves'].values())
+            )
+            
+            # Every grid point must get the crop /api/recommend gives for that input
+            mismatches = 0
+            points = 0
+            for index in np.ndindex(*shape):
+                payload = dict(base)
+                for axis, position in zip(data['axes'], index):
+                    payload[axis['feature']] = axis['values'][position]
+                recommendation = requests.post(
+                    f"{API_BASE_URL}/recommend",
+                    json=payload,
+                    timeout=10
+                ).json()['data']['recommendation']
+                expected = data['recommendations']
+                for position in index:
+                    expected = expected[position]
+                mismatches += recommendation != expected
+                points += 1
+            
+            if shapes_ok and mismatches == 0:
+                print_success(f"{test_name}: shape {shape}, {points} points match /api/recommend")
+                passed += 1
+            else:
+                print_error(
+                    f"{test_name}: shape {data['shape']} (expected {shape}, curves/recommendations "
+                    f"{'ok' if shapes_ok else 'wrong'}), {mismatches}/{points} points differ from /api/recommend"
+                )
+                failed += 1
+                
+        except Exception as e:
+            print_error(f"{test_name}: Exception - {e}")
+            failed += 1
+    
+    print_info(f"\nResults: {passed} passed, {failed} failed")
+    return failed == 0
+
 def test_crops_endpoint():
     """Test crops information endpoint"""
     print_header("Testing Crops Endpoint")
@@ -352,6 +561,172 @@ def test_concurrent_requests():
         print_error(f"Concurrent test failed: {e}")
         return False
 
+def test_batcher():
+    """Test the micro-batching scheduler in-process (no server needed)"""
+    print_header("Testing Micro-batching Scheduler")
+    
+    import concurrent.futures
+    import threading
+    from batching import InferenceBatcher
+    
+    passed = 0
+    failed = 0
+    
+    # Result ordering: every caller gets the result row for its own input,
+    # however the concurrent rows were grouped into batches
+    batcher = InferenceBatcher(lambda matrix: matrix * 2, max_batch=8, max_wait_ms=5)
+    rows = [[float(i), float(-i)] for i in range(200)]
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(lambda row: batcher.predict(row, timeout=5), rows))
+        mismatched = [i for i, (row, result) in enumerate(zip(rows, results))
+                      if list(result) != [value * 2 for value in row]]
+        metrics = batcher.metrics()
+        if not mismatched:
+            print_success(
+                f"Result ordering: {len(rows)} rows in {metrics['batches']} batches "
+                f"(mean size {metrics['mean_batch_size']:.1f})"
+            )
+            passed += 1
+        else:
+            print_error(f"Result ordering: {len(mismatched)} rows got another row's result")
+            failed += 1
+    except Exception as e:
+        print_error(f"Result ordering: Exception - {e}")
+        failed += 1
+    
+    # Cancellation: a row cancelled while queued is dropped, the rest of its
+    # batch is still answered and the collector thread keeps running
+    release = threading.Event()
+    def gated_predict(matrix):
+        release.wait(5)
+        return matrix + 1
+    batcher = InferenceBatcher(gated_predict, max_batch=8, max_wait_ms=0)
+    try:
+        blocker = batcher.submit([0.0])
+        time.sleep(0.1)  # Let the collector pick up the blocker and wait on the gate
+        queued = [batcher.submit([float(i)]) for i in range(1, 5)]
+        cancelled = queued[1].cancel()
+        release.set()
+        answered = [f.result(timeout=5)[0] for f in [blocker] + queued if not f.cancelled()]
+        after = batcher.predict([10.0], timeout=5)[0]
+        if cancelled and answered == [1.0, 2.0, 4.0, 5.0] and after == 11.0:
+            print_success("Cancellation: cancelled row skipped, others answered, batcher still running")
+            passed += 1
+        else:
+            print_error(f"Cancellation: cancelled={cancelled}, answered={answered}, after={after}")
+            failed += 1
+    except Exception as e:
+        print_error(f"Cancellation: Exception - {e}")
+        failed += 1
+    
+    # Errors: a failing predict call is raised to every caller in the batch
+    def failing_predict(matrix):
+        raise ValueError("model failure")
+    batcher = InferenceBatcher(failing_predict, max_batch=8, max_wait_ms=5)
+    try:
+        futures = [batcher.submit([float(i)]) for i in range(4)]
+        errors = [type(f.exception(timeout=5)).__name__ for f in futures]
+        if errors == ["ValueError"] * 4:
+            print_success("Errors: predict failure raised to every caller")
+            passed += 1
+        else:
+            print_error(f"Errors: got {errors}")
+            failed += 1
+    except Exception as e:
+        print_error(f"Errors: Exception - {e}")
+        failed += 1
+    
+    print_info(f"\nResults: {passed} passed, {failed} failed")
+    return failed == 0
+
+def test_irrigation_scheduler():
+    """Test the irrigation scheduler's decisions on known reading sequences in-process (no server needed)"""
+    print_header("Testing Irrigation Scheduler")
+    
+    import math
+    from irrigation import IrrigationScheduler, RAIN_THRESHOLD, pump_command
+    
+    # Hot, dry air and dry soil: waters unless rain says otherwise
+    def hot_dry(rain_value):
+        return {"soil_moisture": 450, "temperature": 33, "humidity": 40, "rain_value": rain_value}
+    
+    def check_rain(scheduler):
+        at_threshold = scheduler.ingest("rain-at", hot_dry(RAIN_THRESHOLD))
+        above = scheduler.ingest("rain-above", hot_dry(RAIN_THRESHOLD + 1))
+        return (at_threshold["pump"] == "off" and at_threshold["reasons"]["recent_rain"]
+                and above["pump"] == "on" and not above["reasons"]["recent_rain"])
+    
+    def check_missing_rain_sensor(scheduler):
+        command = scheduler.ingest("no-rain-sensor", hot_dry(math.nan))
+        return command["pump"] == "on" and not command["reasons"]["recent_rain"]
+    
+    def check_rain_in_window(scheduler):
+        scheduler.ingest("rained", hot_dry(200))
+        command = scheduler.ingest("rained", hot_dry(900))
+        return command["pump"] == "off" and command["reasons"]["recent_rain"]
+    
+    def check_drying_trend(scheduler):
+        # Mild weather, soil drying 30 units per reading: waters once it is
+        # dry and the trend is based on enough readings
+        commands = [
+            scheduler.ingest("drying", {"soil_moisture": moisture, "temperature": 25,
+                                        "humidity": 70, "rain_value": 900})
+            for moisture in (560, 530, 500, 470)
+        ]
+        last = commands[-1]
+        return ([c["pump"] for c in commands] == ["off", "off", "off", "on"]
+                and last["reasons"]["drying_fast"] and not last["reasons"]["heat_stress"]
+                and abs(last["moisture_trend"] + 30) < 1e-9 and last["window_readings"] == 4)
+    
+    def check_repeated_devices(scheduler):
+        # Readings of one device in one batch are applied in order, and every
+        # entry gets the decision after the device's last reading
+        decision = scheduler.ingest_many(
+            ["repeat", "other", "repeat"], [700, 450, 450], [33, 33, 33], [40, 40, 40], [900, 900, 900]
+        )
+        commands = [pump_command(decision, i) for i in decision["entries"]]
+        return (commands[0] == commands[2] and commands[0]["pump"] == "on"
+                and commands[0]["window_readings"] == 2 and commands[1]["window_readings"] == 1)
+    
+    def check_eviction(scheduler):
+        # Capacity 2: after a, b, a the least recently seen device is b
+        small = IrrigationScheduler(max_devices=2)
+        for device_id in ("a", "b", "a"):
+            small.ingest(device_id, hot_dry(900))
+        new = small.ingest("c", hot_dry(900))
+        kept = small.ingest("a", hot_dry(900))
+        returned = small.ingest("b", hot_dry(900))
+        return (new["window_readings"] == 1 and kept["window_readings"] == 3
+                and returned["window_readings"] == 1 and small.evictions == 2 and len(small) == 2)
+    
+    checks = {
+        "Rain at exactly the threshold": check_rain,
+        "Missing rain sensor": check_missing_rain_sensor,
+        "Rain earlier in the window": check_rain_in_window,
+        "Moisture drying trend": check_drying_trend,
+        "Repeated devices in one batch": check_repeated_devices,
+        "Least recently seen eviction": check_eviction
+    }
+    
+    passed = 0
+    failed = 0
+    
+    for test_name, check in checks.items():
+        try:
+            if check(IrrigationScheduler()):
+                print_success(test_name)
+                passed += 1
+            else:
+                print_error(f"{test_name}: Unexpected pump command")
+                failed += 1
+        except Exception as e:
+            print_error(f"{test_name}: Exception - {e}")
+            failed += 1
+    
+    print_info(f"\nResults: {passed} passed, {failed} failed")
+    return failed == 0
+
 def main():
     """Run all tests"""
     print(f"\n{Colors.BOLD}{Colors.HEADER}")
@@ -367,10 +742,15 @@ def main():
         "Health Check": test_health(),
         "Valid Recommendations": test_valid_recommendations(),
         "Invalid Input Handling": test_invalid_inputs(),
+        "Validation Message Parity": test_validation_messages(),
+        "Explanation Additivity": test_explain_additivity(),
+        "Sensitivity Sweep": test_sweep(),
         "Crops Endpoint": test_crops_endpoint(),
         "Stats Endpoint": test_stats_endpoint(),
         "Performance": test_performance(),
-        "Concurrent Requests": test_concurrent_requests()
+        "Concurrent Requests": test_concurrent_requests(),
+        "Micro-batching Scheduler": test_batcher(),
+        "Irrigation Scheduler": test_irrigation_scheduler()
     }
     
     # Summary
@@ -0,0 +1,29 @@
+"""
+Crop Recommendation System - Production WSGI Entry Point
+
+Loads the models once in the master process (the timed startup phase),
+runs warmup inference and then freezes the loaded objects so that pre-forked workers share them.
+
+Usage:
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import gc
+
+import explain
+import recommender
+from app import app
+
+# Warm up before the master forks so every worker starts out ready, and
+# flatten the forest for /api/recommend/explain so workers share it too
+if recommender.startup():
+    explain.prepare()
+
+# Move everything allocated so far (models, scaler, encoder, Flask app) into
+# the permanent GC generation. The cyclic collector then never writes to
+# these objects' headers in the workers, so the pages holding the forest
+# stay shared copy-on-write instead of being duplicated per worker.
+gc.collect()
+gc.freeze()
+
+__all__ = ['app']
@@ -3,6 +3,16 @@ import axios from 'axios';
 import './App.css';
 import CropRecommendationChart from './CropRecommendationChart';
 
+const SWEEP_FEATURES = [
+  { name: 'N', label: 'Nitrogen (N)' },
+  { name: 'P', label: 'Phosphorus (P)' },
+  { name: 'K', label: 'Potassium (K)' },
+  { name: 'temperature', label: 'Temperature' },
+  { name: 'humidity', label: 'Humidity' },
+  { name: 'ph', label: 'pH' },
+  { name: 'rainfall', label: 'Rainfall' }
+];
+
 function App() {
   const [formData, setFormData] = useState({
     N: '',
@@ -19,6 +29,9 @@ function App() {
   const [error, setError] = useState('');
   const [sensorData, setSensorData] = useState(null);
   const [sensorLoading, setSensorLoading] = useState(false);
+  const [sweepFeature, setSweepFeature] = useState('rainfall');
+  const [sweepResult, setSweepResult] = useState(null);
+  const [sweepLoading, setSweepLoading] = useState(false);
 
   const handleChange = (e) => {
     const { name, value } = e.target;
@@ -80,6 +93,7 @@ function App() {
 
     setLoading(true);
     setError('');
+    setSweepResult(null);
 
     try {
       const response = await axios.post('http://localhost:5000/api/recommend', {
@@ -101,6 +115,37 @@ function App() {
     }
   };
 
+  // One request scores the whole what-if range for the selected feature
+  const runSweep = async () => {
+    if (!validateForm()) return;
+
+    setSweepLoading(true);
+    setError('');
+
+    try {
+      const response = await axios.post('http://localhost:5000/api/recommend/sweep', {
+        base: {
+          N: parseFloat(formData.N),
+          P: parseFloat(formData.P),
+          K: parseFloat(formData.K),
+          temperature: parseFloat(formData.temperature),
+          humidity: parseFloat(formData.humidity),
+          ph: parseFloat(formData.ph),
+          rainfall: parseFloat(formData.rainfall)
+        },
+        axes: [{ feature: sweepFeature }],
+        steps: 30
+      });
+
+      setSweepResult(response.data.data);
+    } catch (err) {
+      setError('Error running what-if analysis. Please check if backend is running.');
+      console.error('Sweep API Error:', err);
+    } finally {
+      setSweepLoading(false);
+    }
+  };
+
   const fetchSensorData = async () => {
     setSensorLoading(true);
     setError('');
@@ -367,6 +412,19 @@ function App() {
                     <CropRecommendationChart topRecommendations={result.top_recommendations} />
                   </div>
                 )}
+
+                <div className="top-recommendations">
+                  <h3>What-if Analysis</h3>
+                  <select value={sweepFeature} onChange={(e) => setSweepFeature(e.target.value)}>
+                    {SWEEP_FEATURES.map(feature => (
+                      <option key={feature.name} value={feature.name}>{feature.label}</option>
+                    ))}
+                  </select>
+                  <button type="button" className="sensor-btn" onClick={runSweep} disabled={sweepLoading}>
+                    {sweepLoading ? 'Analyzing...' : 'Show how the recommendation changes'}
+                  </button>
+                  {sweepResult && <CropRecommendationChart sweep={sweepResult} />}
+                </div>
               </div>
             )}
 
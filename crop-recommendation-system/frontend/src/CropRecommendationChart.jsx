@@ -1,10 +1,12 @@
 import React from 'react';
-import { Bar } from 'react-chartjs-2';
+import { Bar, Line } from 'react-chartjs-2';
 import {
   Chart as ChartJS,
   CategoryScale,
   LinearScale,
   BarElement,
+  LineElement,
+  PointElement,
   Title,
   Tooltip,
   Legend,
@@ -14,12 +16,82 @@ ChartJS.register(
   CategoryScale,
   LinearScale,
   BarElement,
+  LineElement,
+  PointElement,
   Title,
   Tooltip,
   Legend
 );
 
-const CropRecommendationChart = ({ topRecommendations }) => {
+const SWEEP_COLORS = [
+  'rgba(75, 192, 192, 1)',
+  'rgba(54, 162, 235, 1)',
+  'rgba(255, 206, 86, 1)',
+  'rgba(255, 99, 132, 1)',
+  'rgba(153, 102, 255, 1)',
+  'rgba(255, 159, 64, 1)',
+  'rgba(46, 125, 50, 1)',
+  'rgba(121, 85, 72, 1)',
+];
+
+// Plots the per-crop probability curves returned by /api/recommend/sweep
+// (one-axis sweeps: x = swept feature value, one line per crop)
+const SweepChart = ({ sweep }) => {
+  const axis = sweep.axes[0];
+
+  const data = {
+    labels: axis.values.map(value => Number(value).toFixed(1)),
+    datasets: sweep.crops.map((crop, index) => ({
+      label: crop,
+      data: sweep.curves[crop].map(p => (p * 100).toFixed(1)),
+      borderColor: SWEEP_COLORS[index % SWEEP_COLORS.length],
+      backgroundColor: SWEEP_COLORS[index % SWEEP_COLORS.length],
+      pointRadius: 0,
+      tension: 0.2,
+    })),
+  };
+
+  const options = {
+    responsive: true,
+    plugins: {
+      legend: {
+        position: 'top',
+      },
+      title: {
+        display: true,
+        text: `Crop Probability vs ${axis.feature}`,
+      },
+    },
+    scales: {
+      y: {
+        beginAtZero: true,
+        max: 100,
+        title: {
+          display: true,
+          text: 'Probability (%)',
+        },
+      },
+      x: {
+        title: {
+          display: true,
+          text: axis.feature,
+        },
+      },
+    },
+  };
+
+  return (
+    <div style={{ marginTop: '20px' }}>
+      <Line data={data} options={options} />
+    </div>
+  );
+};
+
+const CropRecommendationChart = ({ topRecommendations, sweep }) => {
+  if (sweep && sweep.axes && sweep.axes.length === 1) {
+    return <SweepChart sweep={sweep} />;
+  }
+
   if (!topRecommendations || topRecommendations.length === 0) {
     return null;
   }
@@ -36,6 +36,7 @@ PUMP_DURATION = 5                # Run pump for 5 seconds when watering
 
 # Backend API configuration (optional)
 BACKEND_URL = "http://localhost:5000/api/sensor-data"  # Update with your backend URL
+DEVICE_ID = "rpi-01"             # Unique per device; the backend keeps a reading history per ID
 
 def setup_gpio():
     """Setup GPIO pins"""
@@ -64,22 +65,25 @@ def control_pump(state):
     GPIO.output(RELAY_PIN, state)
 
 def send_data_to_backend(soil_moisture, temperature, humidity, rain_value):
-    """Send sensor data to backend API"""
+    """Send sensor data to backend API and return its pump command (None if unavailable)"""
     try:
         data = {
             "timestamp": datetime.now().isoformat(),
+            "device_id": DEVICE_ID,
             "soil_moisture": soil_moisture,
             "temperature": temperature,
             "humidity": humidity,
             "rain_value": rain_value
         }
-        response = requests.post(BACKEND_URL, json=data)
+        response = requests.post(BACKEND_URL, json=data, timeout=10)
         if response.status_code == 200:
             print("Data sent to backend successfully")
+            return response.json().get("pump_command")
         else:
             print(f"Failed to send data to backend: {response.status_code}")
     except Exception as e:
         print(f"Error sending data to backend: {e}")
+    return None
 
 def main():
     print("Crop Irrigation System - Raspberry Pi Version")
@@ -99,10 +103,17 @@ def main():
             print(f"Humidity: {humidity} %")
             print(f"Rain Sensor: {rain_value}")
 
-            # Decision logic for watering
+            # Send data to backend; its scheduler also looks at recent readings
+            pump_command = None
+            if temperature and humidity:
+                pump_command = send_data_to_backend(soil_moisture, temperature, humidity, rain_value)
+
+            # Decision logic for watering (local rule if the backend is unreachable)
             should_water = False
 
-            if soil_moisture < SOIL_MOISTURE_THRESHOLD:
+            if pump_command is not None:
+                should_water = pump_command.get("pump") == "on"
+            elif soil_moisture < SOIL_MOISTURE_THRESHOLD:
                 if temperature and temperature > TEMPERATURE_THRESHOLD and humidity and humidity < HUMIDITY_THRESHOLD:
                     if rain_value > RAIN_THRESHOLD:
                         should_water = True
@@ -116,10 +127,6 @@ def main():
             else:
                 print("No irrigation needed.")
 
-            # Send data to backend (optional)
-            if temperature and humidity:
-                send_data_to_backend(soil_moisture, temperature, humidity, rain_value)
-
             time.sleep(READING_INTERVAL)
 
     except KeyboardInterrupt: